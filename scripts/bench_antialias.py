@@ -0,0 +1,99 @@
+"""compares adaptive antialiasing of ray traced frames with supersampling
+every pixel, by rays traced and mean difference to a frame with 32
+samples in every pixel
+
+run from the root directory of the repo
+    python scripts/bench_antialias.py"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src")))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from mesh.mesh import Meshes
+from views import bvh, camera, ray_trace, view_types
+from bench_compression import terrain
+
+DISPLAY = view_types.Display(width=np.int64(200), height=np.int64(150))
+REFERENCE_SAMPLES = 32
+
+
+def scene() -> Meshes:
+    """a terrain with small red meshes standing on it, lots of edges"""
+    meshes = Meshes()
+    meshes.add_mesh(*terrain(60, 0), np.array([0.5, 0.5, 0.5]))
+    for seed in range(30):
+        vertices, faces = terrain(10, seed)
+        meshes.add_mesh(
+            vertices * 0.2 + np.array([seed * 3, 50, 10]),
+            faces,
+            np.array([1.0, 0.0, 0.0]),
+        )
+    return meshes
+
+
+def supersample(
+    meshes: Meshes, cam: camera.Camera, scene: bvh.SceneBVH, samples: int
+) -> view_types.Raster:
+    """samples rays in every pixel"""
+    scene.update(meshes)
+    view = ray_trace.camera_view(DISPLAY, cam)
+    arrays = ray_trace.SceneArrays.from_scene(scene)
+    depth_bounds = ray_trace.depth_range(scene.tree, view.position)
+    buffers = ray_trace.frame_buffers(view)
+    ys, xs = ray_trace.pixel_grid(slice(0, view.height), slice(0, view.width))
+    ray_trace.trace_pixels(arrays, view, depth_bounds, ys, xs, buffers)
+    ray_trace.antialias_pixels(
+        arrays,
+        view,
+        depth_bounds,
+        ys,
+        xs,
+        ray_trace.sample_offsets(samples)[1:],
+        buffers,
+    )
+    return buffers["color"]
+
+
+def main() -> None:
+    meshes = scene()
+    cam = camera.Camera()
+    cam.set_position(np.array([50, -60, 80], dtype=np.float64))
+    cam.set_focal_point(np.array([50, 50, 0], dtype=np.float64))
+    ray_scene = bvh.SceneBVH()
+    pixels = int(DISPLAY.width * DISPLAY.height)
+    reference = supersample(meshes, cam, ray_scene, REFERENCE_SAMPLES).astype(
+        np.float64
+    )
+
+    print(f"{'frame':<28}{'rays':>10}{'seconds':>10}{'error':>10}")
+
+    def report(
+        name: str, rays: int, start: float, raster: view_types.Raster
+    ) -> None:
+        error = np.abs(raster.astype(np.float64) - reference).mean()
+        print(
+            f"{name:<28}{rays:>10}{perf_counter() - start:>10.3f}"
+            f"{error:>10.3f}"
+        )
+
+    start = perf_counter()
+    raster = ray_trace.render(DISPLAY, meshes, cam, ray_scene)
+    report("1 sample", pixels, start, raster)
+    for samples in (4, 8):
+        start = perf_counter()
+        raster = supersample(meshes, cam, ray_scene, samples)
+        report(f"uniform {samples}", pixels * samples, start, raster)
+    for budget in (pixels // 4, pixels // 2, pixels):
+        start = perf_counter()
+        raster = ray_trace.render(
+            DISPLAY, meshes, cam, ray_scene, samples=8, ray_budget=budget
+        )
+        report(f"adaptive 8, budget {budget}", pixels + budget, start, raster)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""measures the vedo render paths drawing thousands of small meshes in a
+few colors one actor each against merged into batches by color, and how
+long rebuilding the batches takes after one mesh changes
+
+run from the root directory of the repo
+    python scripts/bench_batches.py"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src")))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from mesh.mesh import Meshes
+from views import camera, rasterize, view_types
+from bench_compression import terrain
+
+DISPLAY = view_types.Display(width=np.int64(800), height=np.int64(600))
+FRAMES = 5
+COLORS = np.array(
+    [[0.2, 0.6, 0.2], [0.6, 0.2, 0.2], [0.2, 0.2, 0.6], [0.6, 0.6, 0.2]]
+)
+
+
+def scene(count: int) -> Meshes:
+    meshes = Meshes()
+    side = int(np.ceil(np.sqrt(count)))
+    for seed in range(count):
+        vertices, faces = terrain(6, seed)
+        offset = np.array([seed % side * 2, seed // side * 2, 0])
+        meshes.add_mesh(
+            vertices * 0.02 + offset, faces, COLORS[seed % len(COLORS)]
+        )
+    return meshes
+
+
+def seconds_per_frame(draw) -> float:
+    """after a first frame that fills the caches"""
+    draw()
+    start = perf_counter()
+    for _ in range(FRAMES):
+        draw()
+    return (perf_counter() - start) / FRAMES
+
+
+def main() -> None:
+    print(
+        f"{'meshes':>8}{'path':>6}{'actors':>8}{'frame':>10}"
+        f"{'batched actors':>16}{'frame':>10}{'one changed':>13}"
+    )
+    for count in (500, 2000, 5000):
+        meshes = scene(count)
+        side = np.sqrt(count) * 2
+        cam = camera.Camera()
+        cam.set_position(np.array([side / 2, -side / 2, side], dtype=float))
+        cam.set_focal_point(np.array([side / 2, side / 2, 0], dtype=float))
+        for path in ("orth", "pers"):
+            times = []
+            actors = []
+            for batches in (None, rasterize.SceneBatches()):
+                # vedo only draws into one offscreen window at a time
+                context = rasterize.RenderContext()
+                args = [DISPLAY, meshes, cam, context]
+                if path == "pers":
+                    args.append(rasterize.ProjectionBuffers())
+                    render = rasterize.render_pers
+                else:
+                    render = rasterize.render_orth
+                times.append(
+                    seconds_per_frame(lambda: render(*args, batches=batches))
+                )
+                actors.append(len(context.actors))
+                if batches is not None:
+                    meshes.meshes.touch(next(iter(meshes.meshes)))
+                    start = perf_counter()
+                    render(*args, batches=batches)
+                    times.append(perf_counter() - start)
+                context.close()
+            print(
+                f"{count:>8}{path:>6}{actors[0]:>8}{times[0]:>10.4f}"
+                f"{actors[1]:>16}{times[1]:>10.4f}{times[2]:>13.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
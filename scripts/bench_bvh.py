@@ -0,0 +1,102 @@
+"""measures building the ray tracing BVHs and querying them with primary
+rays, against testing every triangle for a sample of the rays
+
+run from the root directory of the repo
+    python scripts/bench_bvh.py"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src")))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from mesh.mesh import Meshes
+from views import bvh, camera, ray_trace, view_types
+from bench_compression import terrain
+
+DISPLAY = view_types.Display(width=np.int64(320), height=np.int64(240))
+# rays tested against every triangle to estimate the brute force rate
+BRUTE_FORCE_RAYS = 64
+
+
+def scenes() -> dict[str, Meshes]:
+    result: dict[str, Meshes] = {}
+    for size in (50, 150, 400):
+        meshes = Meshes()
+        meshes.add_mesh(*terrain(size, 0), np.array([0.5, 0.5, 0.5]))
+        result[f"terrain {size}"] = meshes
+
+    many_small = Meshes()
+    for seed in range(500):
+        vertices, faces = terrain(20, seed)
+        offset = np.array([seed % 25 * 4, seed // 25 * 5, 0])
+        many_small.add_mesh(
+            vertices * 0.04 + offset, faces, np.array([0.2, 0.6, 0.2])
+        )
+    result["500 small"] = many_small
+    return result
+
+
+def brute_force(
+    scene: bvh.SceneBVH, origin: np.ndarray, directions: np.ndarray
+) -> float:
+    """rays per second testing every triangle of scene"""
+    triangles = scene.triangles
+    start = perf_counter()
+    for direction in directions:
+        bvh.intersect_pairs(
+            np.broadcast_to(origin, triangles.v0.shape),
+            np.broadcast_to(direction, triangles.v0.shape),
+            triangles,
+        ).min()
+    return len(directions) / (perf_counter() - start)
+
+
+def main() -> None:
+    cam = camera.Camera()
+    cam.set_position(np.array([50, -60, 80], dtype=np.float64))
+    cam.set_focal_point(np.array([50, 50, 0], dtype=np.float64))
+    origin, directions = ray_trace.primary_rays(DISPLAY, cam)
+    origins = np.broadcast_to(origin, directions.shape)
+    sample = directions[
+        np.linspace(0, len(directions) - 1, BRUTE_FORCE_RAYS).astype(int)
+    ]
+
+    print(
+        f"{'scene':<14}{'triangles':>10}{'build s':>10}{'tree MB':>10}"
+        f"{'update s':>10}{'rebuild 1 s':>13}{'rays/s':>10}"
+        f"{'brute rays/s':>14}"
+    )
+    for name, meshes in scenes().items():
+        scene = bvh.SceneBVH()
+        start = perf_counter()
+        scene.update(meshes)
+        build_time = perf_counter() - start
+        megabytes = (scene.tree.nbytes + scene.triangles.data.nbytes) / 1e6
+
+        # nothing changed, the cached trees are reused
+        start = perf_counter()
+        scene.update(meshes)
+        update_time = perf_counter() - start
+
+        meshes.mark_dirty(next(iter(meshes.meshes)))
+        start = perf_counter()
+        scene.update(meshes)
+        rebuild_time = perf_counter() - start
+
+        start = perf_counter()
+        scene.intersect(origins, directions)
+        rays_per_second = len(directions) / (perf_counter() - start)
+
+        print(
+            f"{name:<14}{len(scene.triangles):>10}{build_time:>10.3f}"
+            f"{megabytes:>10.1f}{update_time:>10.4f}{rebuild_time:>13.3f}"
+            f"{rays_per_second:>10.0f}"
+            f"{brute_force(scene, origin, sample):>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""compares file size and save/load throughput of the scene formats and
+compression codecs on a few generated scenes
+
+run from the root directory of the repo
+    python scripts/bench_compression.py"""
+
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src")))
+
+import numpy as np
+from mesh.mesh import Meshes
+from mesh.compression import Codec, default_workers
+
+
+def grid_faces(rows: int, cols: int) -> np.ndarray:
+    """two triangles per cell of a rows x cols grid of vertices"""
+    index = np.arange(rows * cols).reshape(rows, cols)
+    a = index[:-1, :-1].ravel()
+    b = index[:-1, 1:].ravel()
+    c = index[1:, :-1].ravel()
+    d = index[1:, 1:].ravel()
+    return np.concatenate(
+        [np.stack([a, b, c], axis=1), np.stack([b, d, c], axis=1)]
+    )
+
+
+def terrain(size: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """smooth height field, compresses like scanned or modelled surfaces"""
+    rng = np.random.default_rng(seed)
+    x, y = np.meshgrid(np.linspace(0, 100, size), np.linspace(0, 100, size))
+    z = 5 * np.sin(x / 7) * np.cos(y / 11) + rng.normal(0, 0.05, x.shape)
+    vertices = np.stack([x.ravel(), y.ravel(), z.ravel()], axis=1)
+    return vertices, grid_faces(size, size)
+
+
+def scenes() -> dict[str, Meshes]:
+    one_large = Meshes()
+    one_large.add_mesh(*terrain(1000, 0), np.array([0.5, 0.5, 0.5]))
+
+    many_small = Meshes()
+    for seed in range(2000):
+        many_small.add_mesh(*terrain(20, seed), np.array([0.2, 0.6, 0.2]))
+
+    noise = Meshes()
+    rng = np.random.default_rng(0)
+    noise.add_mesh(
+        rng.uniform(0, 100, (500_000, 3)),
+        rng.integers(0, 500_000, (1_000_000, 3)),
+        np.array([1.0, 0.0, 0.0]),
+    )
+    return {"one large": one_large, "many small": many_small, "noise": noise}
+
+
+def raw_bytes(meshes: Meshes) -> int:
+    return sum(
+        record.vertices.nbytes + record.faces.nbytes
+        for _, record in meshes.records()
+    )
+
+
+def main() -> None:
+    configs: list[tuple[str, dict]] = [
+        ("stream", dict(format=Meshes.Format.STREAM)),
+        ("indexed", dict(format=Meshes.Format.INDEXED)),
+    ]
+    for codec in Codec:
+        for workers in sorted({1, default_workers()}):
+            configs.append(
+                (
+                    f"{codec.name.lower()} x{workers}",
+                    dict(
+                        format=Meshes.Format.COMPRESSED,
+                        codec=codec,
+                        workers=workers,
+                    ),
+                )
+            )
+
+    print(
+        f"{'scene':<12}{'format':<16}{'ratio':>8}"
+        f"{'save MB/s':>12}{'load MB/s':>12}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory).joinpath("scene")
+        for name, meshes in scenes().items():
+            megabytes = raw_bytes(meshes) / 1e6
+            for label, options in configs:
+                start = perf_counter()
+                meshes.save(path, **options)
+                save_time = perf_counter() - start
+
+                loaded = Meshes()
+                start = perf_counter()
+                loaded.load(path, workers=options.get("workers"))
+                # touch the arrays so mapped formats are actually read
+                for _, record in loaded.records():
+                    record.vertices.sum()
+                    record.faces.sum()
+                load_time = perf_counter() - start
+
+                ratio = megabytes * 1e6 / path.stat().st_size
+                print(
+                    f"{name:<12}{label:<16}{ratio:>8.2f}"
+                    f"{megabytes / save_time:>12.1f}"
+                    f"{megabytes / load_time:>12.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""counts the full frame buffers the Viewer allocates while rendering 4K
+frames of a moving camera, and the time per frame
+
+run from the root directory of the repo
+    python scripts/bench_rasters.py"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src")))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from mesh.mesh import Meshes
+from views import view_types
+from views.view import Viewer
+from bench_compression import terrain
+
+DISPLAY = view_types.Display(width=np.int64(3840), height=np.int64(2160))
+WARM_UP = 12
+FRAMES = 24
+
+
+def main() -> None:
+    meshes = Meshes()
+    meshes.add_mesh(*terrain(200, 0), np.array([0.5, 0.5, 0.5]))
+
+    print(
+        f"{'backend':<24}{'warm up':>9}{'after':>7}{'pool MB':>9}"
+        f"{'s/frame':>9}"
+    )
+    for mode, perspective in (
+        (Viewer.Rendering.SOFTWARE, Viewer.Perspective.PERSPECTIVE),
+        (Viewer.Rendering.SOFTWARE, Viewer.Perspective.ORTHOGRAPHIC),
+        (Viewer.Rendering.RASTERIZE, Viewer.Perspective.PERSPECTIVE),
+        (Viewer.Rendering.RASTERIZE, Viewer.Perspective.ORTHOGRAPHIC),
+    ):
+        viewer = Viewer(workers=1)
+        viewer.render_mode = mode
+        viewer.view_mode = perspective
+        viewer.cam.set_position(np.array([100, -120, 160], dtype=float))
+        viewer.cam.set_focal_point(np.array([100, 100, 0], dtype=float))
+        shown = None
+        for _ in range(WARM_UP):
+            viewer.rotate_cam(np.float64(0.5), np.float64(0))
+            # a window keeps showing the last frame until the next one
+            shown = viewer.render(DISPLAY, meshes)
+        warm_up = viewer.rasters.allocations
+        start = perf_counter()
+        for _ in range(FRAMES):
+            viewer.rotate_cam(np.float64(0.5), np.float64(0))
+            shown = viewer.render(DISPLAY, meshes)
+        seconds = (perf_counter() - start) / FRAMES
+        del shown
+        viewer.orth_context.close()
+        viewer.pers_context.close()
+        print(
+            f"{mode.name + ' ' + perspective.name.lower():<24}"
+            f"{warm_up:>9}{viewer.rasters.allocations - warm_up:>7}"
+            f"{viewer.rasters.nbytes() / (1 << 20):>9.0f}{seconds:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
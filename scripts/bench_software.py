@@ -0,0 +1,91 @@
+"""measures the numpy z-buffer rasterizer against the vedo render paths
+on the same scenes and camera
+
+run from the root directory of the repo
+    python scripts/bench_software.py"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src")))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from mesh.mesh import Meshes
+from views import camera, rasterize, software, view_types
+from bench_compression import terrain
+
+DISPLAY = view_types.Display(width=np.int64(800), height=np.int64(600))
+FRAMES = 5
+
+
+def scenes() -> dict[str, Meshes]:
+    result: dict[str, Meshes] = {}
+    for size in (50, 150, 400):
+        meshes = Meshes()
+        meshes.add_mesh(*terrain(size, 0), np.array([0.5, 0.5, 0.5]))
+        result[f"terrain {size}"] = meshes
+
+    many_small = Meshes()
+    for seed in range(500):
+        vertices, faces = terrain(20, seed)
+        offset = np.array([seed % 25 * 4, seed // 25 * 5, 0])
+        many_small.add_mesh(
+            vertices * 0.04 + offset, faces, np.array([0.2, 0.6, 0.2])
+        )
+    result["500 small"] = many_small
+    return result
+
+
+def seconds_per_frame(draw) -> float:
+    """after a first frame that fills the caches"""
+    draw()
+    start = perf_counter()
+    for _ in range(FRAMES):
+        draw()
+    return (perf_counter() - start) / FRAMES
+
+
+def main() -> None:
+    cam = camera.Camera()
+    cam.set_position(np.array([50, -60, 80], dtype=np.float64))
+    cam.set_focal_point(np.array([50, 50, 0], dtype=np.float64))
+
+    print(
+        f"{'scene':<14}{'software pers':>15}{'software orth':>15}"
+        f"{'vedo pers':>12}{'vedo orth':>12}"
+    )
+    for name, meshes in scenes().items():
+        context = software.SoftwareContext()
+        orth_context = rasterize.RenderContext()
+        pers_context = rasterize.RenderContext()
+        buffers = rasterize.ProjectionBuffers()
+        times = [
+            seconds_per_frame(
+                lambda: software.render(DISPLAY, meshes, cam, True, context)
+            ),
+            seconds_per_frame(
+                lambda: software.render(DISPLAY, meshes, cam, False, context)
+            ),
+            seconds_per_frame(
+                lambda: rasterize.render_pers(
+                    DISPLAY, meshes, cam, pers_context, buffers
+                )
+            ),
+            seconds_per_frame(
+                lambda: rasterize.render_orth(
+                    DISPLAY, meshes, cam, orth_context
+                )
+            ),
+        ]
+        orth_context.close()
+        pers_context.close()
+        print(
+            f"{name:<14}{times[0]:>15.4f}{times[1]:>15.4f}"
+            f"{times[2]:>12.4f}{times[3]:>12.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
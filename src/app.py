@@ -10,12 +10,29 @@ from PySide6.QtWidgets import (
     QWidget,
     QComboBox,
     QPlainTextEdit,
+    QStatusBar,
+)
+from PySide6.QtCore import (
+    QFile,
+    QSize,
+    QPoint,
+    QObject,
+    QTimer,
+    Qt,
+    Signal,
 )
-from PySide6.QtCore import QFile, QSize, QPoint
 from PySide6.QtUiTools import QUiLoader
-from PySide6.QtGui import QImage, QPixmap, QImageReader, QResizeEvent
+from PySide6.QtGui import (
+    QImage,
+    QPixmap,
+    QImageReader,
+    QResizeEvent,
+    QCloseEvent,
+)
+from threading import Thread
 import sys
 from views.view import Viewer
+from views.render_thread import RenderThread
 from views import view_types
 from mesh.mesh import Meshes
 from enum import Enum
@@ -25,6 +42,28 @@ QT_UI_DIR: Path = Path(__file__).parent.joinpath("qt")
 UI_FILE: str = "main.ui"
 COMPONENTS_FILE: str = "components.ui"
 
+# share of the display's resolution rendered while the window is resized
+PREVIEW_SCALE: float = 0.25
+# milliseconds without a resize event before a full resolution frame
+RESIZE_IDLE_MS: int = 200
+
+
+class FrameSignal(QObject):
+    """carries (ticket, raster, meshes culled) from the render thread to
+    the UI thread"""
+
+    ready = Signal(int, object, int)
+    # (ticket, exception) of a request that failed to render
+    failed = Signal(int, object)
+
+
+class LoadSignal(QObject):
+    """carries the progress and result of a load from its thread to the UI
+    thread"""
+
+    progress = Signal(int, int)
+    finished = Signal(bool)
+
 
 class MainWindow(QMainWindow):
     class WindowState(Enum):
@@ -111,12 +150,30 @@ class MainWindow(QMainWindow):
 
     # image being displayed by the renderer
     display: QLabel | None
+    # renders on its own thread and emits frames through frame_signal,
+    # only frames of the newest request are shown
+    renderer: RenderThread
+    frame_signal: FrameSignal
+    requested: int = 0
+    # loads scenes off the UI thread while holding the renderer's
+    # scene_lock, controls that change the scene are disabled meanwhile
+    load_signal: LoadSignal
+    loader: Thread | None = None
+    # last frame shown, kept at the resolution it was rendered at so it can
+    # be scaled again when the display changes size
+    shown_raster: view_types.Raster | None = None
+    # restarted by every resize event, renders the full resolution frame
+    # once resizing has been idle for resize_idle_ms
+    resize_timer: QTimer
+    resize_idle_ms: int = RESIZE_IDLE_MS
 
     viewer: Viewer = Viewer()
     meshes: Meshes = Meshes()
     sidebar: QVBoxLayout | None
     file_bar: QVBoxLayout | None
     view_bar: QVBoxLayout | None
+    # shows how many meshes the frame on display culled
+    statusbar: QStatusBar | None
 
     def __init__(self):
         super(MainWindow, self).__init__()
@@ -126,6 +183,25 @@ class MainWindow(QMainWindow):
         self.sidebar = self.home_widget.findChild(QVBoxLayout, "sidebar")
         self.file_bar = self.comp_widgets.findChild(QVBoxLayout, "File")
         self.view_bar = self.comp_widgets.findChild(QVBoxLayout, "View")
+        self.statusbar = self.home_widget.findChild(QStatusBar, "statusbar")
+
+        self.frame_signal = FrameSignal(self)
+        self.frame_signal.ready.connect(self.receive_frame)
+        self.frame_signal.failed.connect(self.receive_failure)
+        self.renderer = RenderThread(
+            self.viewer,
+            self.meshes,
+            self.frame_signal.ready.emit,
+            self.frame_signal.failed.emit,
+        )
+        self.load_signal = LoadSignal(self)
+        self.load_signal.progress.connect(self.show_load_progress)
+        self.load_signal.finished.connect(self.finish_load)
+
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(self.resize_idle_ms)
+        self.resize_timer.timeout.connect(self.update_display)
 
         self.init_main_menu()
 
@@ -536,17 +612,66 @@ class MainWindow(QMainWindow):
         if not temp.exists():
             return
         self.working_file = temp
-        self.have_working_file = True
-        if not self.meshes.load(self.working_file):
+        self.set_scene_editable(False)
+        self.loader = Thread(
+            target=self.load_scene, args=(temp,), name="load", daemon=True
+        )
+        self.loader.start()
+
+    def load_scene(self, path: Path) -> None:
+        """runs on self.loader, the render thread waits for the scene_lock
+        until the load is done"""
+        with self.renderer.scene_lock:
+            loaded = self.meshes.load(
+                path, progress=self.load_signal.progress.emit
+            )
+        self.load_signal.finished.emit(loaded)
+
+    def show_load_progress(self, read: int, total: int) -> None:
+        """slot of self.load_signal.progress"""
+        self.setWindowTitle(f"Loading {100 * read // max(total, 1)}%")
+
+    def finish_load(self, loaded: bool) -> None:
+        """slot of self.load_signal.finished"""
+        self.loader = None
+        self.setWindowTitle("")
+        self.set_scene_editable(True)
+        if not loaded:
             self.have_working_file = False
             self.working_file = None
         else:
+            self.have_working_file = True
             self.update_display()
 
+    def set_scene_editable(self, editable: bool) -> None:
+        """enables or disables every control that changes, saves or
+        replaces the scene"""
+        for widget in (
+            self.file_menu.new_button,
+            self.file_menu.open_button,
+            self.file_menu.save_button,
+            self.file_menu.save_as_button,
+            self.insert_menu.mesh_combo,
+            self.insert_menu.add_new_mesh,
+        ):
+            widget.setEnabled(editable)
+
     def file_save(self) -> None:
         """event handler for self.file_menu.save_button"""
         if self.have_working_file and self.working_file is not None:
-            self.meshes.save(self.working_file)
+            with self.renderer.scene_lock:
+                self.meshes.save(
+                    self.working_file, self.save_format(self.working_file)
+                )
+
+    def save_format(self, path: Path) -> Meshes.Format:
+        """a journal the scene was loaded from or saved to only has the
+        meshes changed since then appended. any other save writes the
+        whole scene, in the indexed format so opening it maps the arrays
+        instead of parsing them"""
+        if self.meshes.appendable(path):
+            return Meshes.Format.JOURNAL
+        return Meshes.Format.INDEXED
 
     def file_save_as(self) -> None:
         """event handler for self.file_menu.save_as_button"""
@@ -559,7 +684,10 @@ class MainWindow(QMainWindow):
         )
         self.have_working_file = True
         self.file_menu.save_as_text.clear()
-        if not self.meshes.save(self.working_file):
+        with self.renderer.scene_lock:
+            # a new file is always written whole
+            saved = self.meshes.save(self.working_file, Meshes.Format.INDEXED)
+        if not saved:
             self.have_working_file = False
             self.working_file = None
 
@@ -653,6 +781,11 @@ class MainWindow(QMainWindow):
 
         key = self.insert_menu.mesh_combo.itemText(index)
 
+        with self.renderer.scene_lock:
+            self.insert_mesh(key)
+        self.update_display()
+
+    def insert_mesh(self, key: str) -> None:
         if key == "Sample 1":
             self.meshes.add_mesh(
                 [(50, 50, 50), (70, 40, 50), (50, 40, 80), (80, 70, 50)],
@@ -676,8 +809,6 @@ class MainWindow(QMainWindow):
                 color,
             )
 
-        self.update_display()
-
     def insert_add_new(self):
         if (
             self.insert_menu.new_vertices_text.toPlainText() == ""
@@ -693,11 +824,12 @@ class MainWindow(QMainWindow):
         facesList = eval(faces)
         colorList = eval(color)
 
-        self.meshes.add_mesh(
-            verticesList,
-            facesList,
-            colorList,
-        )
+        with self.renderer.scene_lock:
+            self.meshes.add_mesh(
+                verticesList,
+                facesList,
+                colorList,
+            )
 
         for key in self.meshes.meshes:
             self.insert_menu.mesh_combo.addItem(key)
@@ -705,24 +837,72 @@ class MainWindow(QMainWindow):
 
         self.update_display()
 
-    def update_display(self) -> None:
+    def update_display(self, scale: float = 1.0) -> None:
+        """asks for a frame of the display at scale times its resolution,
+        smaller frames are scaled to cover the display"""
         if not self.have_working_file or self.display is None:
             return
         dimensions: view_types.Display = view_types.Display(
             width=np.int64(self.display.size().width()),
             height=np.int64(self.display.size().height()),
-        )
-
-        raster: view_types.Raster = self.viewer.render(dimensions, self.meshes)
+        ).scaled(scale)
+
+        # a new camera or scene makes the frame in flight stale
+        self.requested = self.renderer.request(dimensions)
+
+    def receive_frame(
+        self, ticket: int, raster: view_types.Raster, culled: int
+    ) -> None:
+        """slot of self.frame_signal, frames of older requests that were
+        already on their way are dropped"""
+        if ticket == self.requested:
+            self.show_raster(raster)
+            if self.statusbar is not None:
+                self.statusbar.showMessage(f"meshes culled: {culled}")
+
+    def receive_failure(self, ticket: int, error: Exception) -> None:
+        """slot of self.frame_signal, the frame on display stays"""
+        if ticket == self.requested and self.statusbar is not None:
+            self.statusbar.showMessage(f"render failed: {error}")
+
+    def show_raster(self, raster: view_types.Raster) -> None:
+        """shows raster scaled to cover the display when it was rendered
+        at another resolution"""
+        if self.display is None:
+            return
+        resolution = view_types.Display.of_raster(raster)
+        width, height = int(resolution.width), int(resolution.height)
+        # borrows the raster's memory without a copy. fromImage converts
+        # RGB888 into a pixmap of its own, and the raster is held as
+        # self.shown_raster until after that pixmap is shown, so the pool
+        # cannot lend its buffer again while anything may read it
         image: QImage = QImage(
             raster.data,
-            int(dimensions.width),
-            int(dimensions.height),
-            int(3 * dimensions.width),
+            width,
+            height,
+            raster.strides[0],
             QImage.Format_RGB888,  # type: ignore
         )
 
-        self.display.setPixmap(QPixmap.fromImage(image))
+        pixmap = QPixmap.fromImage(image)
+        size: QSize = self.display.size()
+        if (width, height) != (size.width(), size.height()):
+            # scaled the same along both axes and cropped to the display,
+            # stretching would distort previews whose sides were rounded
+            # and frames of the size before a resize
+            pixmap = pixmap.scaled(
+                size,
+                Qt.KeepAspectRatioByExpanding,  # type: ignore
+                Qt.FastTransformation,  # type: ignore
+            )
+            pixmap = pixmap.copy(
+                (pixmap.width() - size.width()) // 2,
+                (pixmap.height() - size.height()) // 2,
+                size.width(),
+                size.height(),
+            )
+        self.display.setPixmap(pixmap)
+        self.shown_raster = raster
 
     def resize_display(self) -> None:
         if self.display is None:
@@ -736,8 +916,20 @@ class MainWindow(QMainWindow):
         )
 
     def resizeEvent(self, event: QResizeEvent) -> None:
+        """scales the last frame at once and renders previews at
+        PREVIEW_SCALE while resizing, then the full resolution frame after
+        resize_idle_ms without another resize"""
         self.resize_display()
-        self.update_display()
+        if self.shown_raster is not None:
+            self.show_raster(self.shown_raster)
+        self.update_display(PREVIEW_SCALE)
+        self.resize_timer.start(self.resize_idle_ms)
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        if self.loader is not None:
+            self.loader.join()
+        self.renderer.close()
+        super().closeEvent(event)
 
 
 def main() -> None:
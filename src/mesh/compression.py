@@ -0,0 +1,184 @@
+"""compressed scenes
+
+the same mesh.proto Mesh messages as the stream format but every message
+is split into chunks of at most CHUNK_SIZE bytes that are compressed on
+their own, so records (and large meshes inside a record) can be compressed
+and decompressed on a thread pool (zlib, lzma and bz2 release the GIL
+while they work)
+
+    magic (8 bytes) | codec (uint8) | record...
+    record: chunk count (uint32) | (size (uint32) | compressed chunk)..."""
+
+from typing import Callable, Iterable, Iterator, TypeVar
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from collections import deque
+from pathlib import Path
+from enum import Enum
+import bz2
+import lzma
+import os
+import struct
+import zlib
+
+MAGIC = b"SKWZSCN\x00"
+HEADER = struct.Struct("<8sB")
+SIZE = struct.Struct("<I")
+CHUNK_SIZE = 4 * 1024 * 1024
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Codec(Enum):
+    ZLIB = 1
+    LZMA = 2
+    BZ2 = 3
+
+
+# level used when none is given. zlib and bz2 keep their library
+# defaults, bz2's level only sets its block size and barely changes its
+# speed or ratio on mesh data. lzma, far slower than the others at its
+# default of 6, uses its fastest preset
+DEFAULT_LEVELS: dict[Codec, int] = {
+    Codec.ZLIB: 6,
+    Codec.LZMA: 1,
+    Codec.BZ2: 9,
+}
+
+
+def compress(codec: Codec, data: bytes, level: int | None = None) -> bytes:
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+    if codec == Codec.ZLIB:
+        return zlib.compress(data, level)
+    if codec == Codec.LZMA:
+        return lzma.compress(data, preset=level)
+    return bz2.compress(data, level)
+
+
+def decompress(codec: Codec, data: bytes) -> bytes:
+    if codec == Codec.ZLIB:
+        return zlib.decompress(data)
+    if codec == Codec.LZMA:
+        return lzma.decompress(data)
+    return bz2.decompress(data)
+
+
+def default_workers() -> int:
+    return min(32, os.cpu_count() or 1)
+
+
+def bounded_map(
+    executor: Executor,
+    function: Callable[[T], R],
+    items: Iterable[T],
+    window: int,
+) -> Iterator[R]:
+    """executor.map that keeps at most window items in flight instead of
+    submitting the whole iterable up front"""
+    pending: deque[Future[R]] = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def is_compressed(path: Path) -> bool:
+    with path.open("rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def split(serialized_meshes: Iterable[bytes]) -> Iterator[tuple[int, bytes]]:
+    """yields (chunk count, chunk) with the count of the record on its
+    first chunk and 0 on the rest"""
+    for serialized_mesh in serialized_meshes:
+        view = memoryview(serialized_mesh)
+        count = max(1, -(-len(view) // CHUNK_SIZE))
+        for i in range(count):
+            chunk = view[i * CHUNK_SIZE : (i + 1) * CHUNK_SIZE]
+            yield (count if i == 0 else 0), chunk
+
+
+def join(
+    chunks: Iterable[tuple[int, bytes, int]],
+) -> Iterator[tuple[bytes, int]]:
+    """undoes split for (chunk count, chunk, end of chunk in file), yields
+    (record, end of record in file)"""
+    parts: list[bytes] = []
+    remaining = 0
+    for count, chunk, end in chunks:
+        if count:
+            remaining = count
+        parts.append(chunk)
+        remaining -= 1
+        if remaining == 0:
+            yield b"".join(parts), end
+            parts.clear()
+
+
+def write(
+    path: Path,
+    serialized_meshes: Iterable[bytes],
+    codec: Codec = Codec.ZLIB,
+    level: int | None = None,
+    workers: int | None = None,
+) -> None:
+    workers = workers or default_workers()
+    with (
+        path.open("wb") as file,
+        ThreadPoolExecutor(max_workers=workers) as executor,
+    ):
+        file.write(HEADER.pack(MAGIC, codec.value))
+        for count, compressed in bounded_map(
+            executor,
+            lambda chunk: (chunk[0], compress(codec, chunk[1], level)),
+            split(serialized_meshes),
+            2 * workers,
+        ):
+            if count:
+                file.write(SIZE.pack(count))
+            file.write(SIZE.pack(len(compressed)))
+            file.write(compressed)
+
+
+def read_compressed(path: Path) -> Iterator[tuple[int, bytes, int]]:
+    """yields (chunk count, compressed chunk, end of chunk in file) in the
+    same form as split"""
+    with path.open("rb") as file:
+        file.seek(HEADER.size)
+        while True:
+            count_data = file.read(SIZE.size)
+            if not count_data:
+                break
+            count: int = SIZE.unpack(count_data)[0]
+            for i in range(count):
+                size: int = SIZE.unpack(file.read(SIZE.size))[0]
+                yield (count if i == 0 else 0), file.read(size), file.tell()
+
+
+def read(
+    path: Path, workers: int | None = None
+) -> Iterator[tuple[bytes, int]]:
+    """yields (serialized Mesh, end of its record in file) for the records
+    in path in file order"""
+    with path.open("rb") as file:
+        magic, codec_value = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path.absolute()} is not a compressed scene")
+    codec = Codec(codec_value)
+    workers = workers or default_workers()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from join(
+            bounded_map(
+                executor,
+                lambda chunk: (
+                    chunk[0],
+                    decompress(codec, chunk[1]),
+                    chunk[2],
+                ),
+                read_compressed(path),
+                2 * workers,
+            )
+        )
@@ -0,0 +1,156 @@
+"""append only scene journals
+
+every save appends the records of new or changed meshes and tombstones for
+deleted ones, the newest entry for an id wins when the journal is
+replayed. compaction rewrites the journal with only the live entries
+
+    magic (8 bytes) | codec (uint8, 0 for none) | entry...
+    entry: kind (uint8) | id size (uint16) | payload size (uint32) | id |
+           payload (serialized mesh.proto Mesh, empty for tombstones)
+
+an entry cut short by a crash while appending is ignored on replay"""
+
+from typing import Iterable, Iterator
+from pathlib import Path
+from enum import Enum
+from mesh import compression
+import struct
+
+MAGIC = b"SKWJRNL\x00"
+HEADER = struct.Struct("<8sB")
+ENTRY = struct.Struct("<BHI")
+
+# rewrite the journal once more than this fraction of it is dead entries
+COMPACT_THRESHOLD = 0.5
+
+
+class Kind(Enum):
+    RECORD = 1
+    TOMBSTONE = 2
+
+
+def is_journal(path: Path) -> bool:
+    with path.open("rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class Journal:
+    path: Path
+    codec: compression.Codec | None
+    # (offset, size) of the entry holding the current record of each id
+    live: dict[str, tuple[int, int]]
+    # size of the file
+    size: int
+
+    def __init__(self, path: Path, codec: compression.Codec | None = None):
+        self.path = path
+        self.codec = codec
+        self.live = {}
+        self.size = HEADER.size
+
+    def garbage(self) -> float:
+        """fraction of the file taken up by superseded entries"""
+        dead = self.size - HEADER.size
+        dead -= sum(size for _, size in self.live.values())
+        return dead / self.size
+
+    def encode(self, kind: Kind, id: str, payload: bytes) -> bytes:
+        if self.codec is not None and kind == Kind.RECORD:
+            payload = compression.compress(self.codec, payload)
+        encoded_id = id.encode()
+        return (
+            ENTRY.pack(kind.value, len(encoded_id), len(payload))
+            + encoded_id
+            + payload
+        )
+
+    def write(self, records: Iterable[tuple[str, bytes]]) -> None:
+        """starts the journal over with records as its only entries"""
+        self.live.clear()
+        with self.path.open("wb") as file:
+            file.write(
+                HEADER.pack(
+                    MAGIC, 0 if self.codec is None else self.codec.value
+                )
+            )
+            for id, serialized_mesh in records:
+                entry = self.encode(Kind.RECORD, id, serialized_mesh)
+                self.live[id] = (file.tell(), len(entry))
+                file.write(entry)
+            self.size = file.tell()
+
+    def append(
+        self, records: Iterable[tuple[str, bytes]], tombstones: Iterable[str]
+    ) -> None:
+        with self.path.open("r+b") as file:
+            # drops an entry left incomplete by an earlier crash
+            file.seek(self.size)
+            file.truncate()
+            for id in tombstones:
+                entry = self.encode(Kind.TOMBSTONE, id, b"")
+                file.write(entry)
+                self.live.pop(id, None)
+            for id, serialized_mesh in records:
+                entry = self.encode(Kind.RECORD, id, serialized_mesh)
+                self.live[id] = (file.tell(), len(entry))
+                file.write(entry)
+            self.size = file.tell()
+
+    @classmethod
+    def replay(cls, path: Path) -> "Journal":
+        """reads the entry headers of the journal at path to find the live
+        record of every id, payloads are skipped over"""
+        with path.open("rb") as file:
+            magic, codec_value = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path.absolute()} is not a journal")
+            journal = cls(
+                path,
+                None if codec_value == 0 else compression.Codec(codec_value),
+            )
+
+            file_size = path.stat().st_size
+            end = HEADER.size
+            while True:
+                entry_data = file.read(ENTRY.size)
+                if len(entry_data) < ENTRY.size:
+                    break
+                kind, id_size, payload_size = ENTRY.unpack(entry_data)
+                encoded_id = file.read(id_size)
+                payload_start = file.tell()
+                if (
+                    len(encoded_id) < id_size
+                    or payload_start + payload_size > file_size
+                ):
+                    break
+                file.seek(payload_size, 1)
+                id = encoded_id.decode()
+                if Kind(kind) == Kind.TOMBSTONE:
+                    journal.live.pop(id, None)
+                else:
+                    journal.live[id] = (end, file.tell() - end)
+                end = file.tell()
+            journal.size = end
+        return journal
+
+    def spans(self) -> list[tuple[str, int, int]]:
+        """(id, payload offset, payload size) of every live record in file
+        order"""
+        spans: list[tuple[str, int, int]] = []
+        for id, (offset, size) in sorted(
+            self.live.items(), key=lambda item: item[1][0]
+        ):
+            header_size = ENTRY.size + len(id.encode())
+            spans.append((id, offset + header_size, size - header_size))
+        return spans
+
+    def read(self) -> Iterator[tuple[str, bytes, int]]:
+        """yields (id, serialized Mesh, end of its entry) for every live
+        record in file order"""
+        with self.path.open("rb") as file:
+            for id, payload_start, payload_size in self.spans():
+                file.seek(payload_start)
+                payload = file.read(payload_size)
+                if self.codec is not None:
+                    payload = compression.decompress(self.codec, payload)
+                yield id, payload, payload_start + payload_size
@@ -0,0 +1,133 @@
+"""levels of detail of a mesh by vertex clustering
+
+level 0 is the mesh itself. every further level snaps the vertices to a
+grid of cells twice as large as the last, merges the vertices sharing a
+cell into their mean and drops the triangles that collapsed. a level's
+cell size bounds how far its vertices moved, renderers pick the coarsest
+level whose cells are still about a pixel on screen
+
+chains are built on a background thread so asking for one never stalls a
+frame, the full mesh is drawn until it is ready"""
+
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Annotated, Any
+import numpy as np
+
+Vertices = Annotated[np.ndarray[Any, np.dtype[np.float64]], "shape=(N,3)"]
+Triangles = Annotated[np.ndarray[Any, np.dtype[np.int64]], "shape=(N,3)"]
+
+# decimated levels after the full mesh
+LEVELS = 4
+# meshes with fewer triangles are not decimated, levels stop above it
+MIN_TRIANGLES = 64
+# a level has to drop at least this share of the last one's triangles
+MIN_REDUCTION = 0.25
+# bits of a cell coordinate along each axis in a cluster key
+KEY_BITS = 21
+
+# builds the chains asked for, one at a time
+builder: ThreadPoolExecutor | None = None
+
+
+@dataclass
+class Level:
+    vertices: Vertices
+    triangles: Triangles
+    # edge length of the clustering cells, 0 for the full mesh
+    cell: float
+
+
+def triangulate(faces: np.ndarray) -> Triangles:
+    """(T, 3) vertex indices of the triangles fanned from polygon faces"""
+    faces = np.asarray(faces, dtype=np.int64)
+    if faces.ndim != 2 or faces.shape[1] < 3:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.concatenate(
+        [faces[:, [0, i, i + 1]] for i in range(1, faces.shape[1] - 1)]
+    )
+
+
+def mean_edge(vertices: Vertices, triangles: Triangles) -> float:
+    corners = vertices[triangles]
+    return float(
+        np.linalg.norm(corners - np.roll(corners, 1, axis=1), axis=2).mean()
+    )
+
+
+def cluster(vertices: Vertices, triangles: Triangles, cell: float) -> Level:
+    """merges the vertices in every cell x cell x cell box of a grid"""
+    cells = np.floor((vertices - vertices.min(axis=0)) / cell).astype(np.int64)
+    cells = np.minimum(cells, (1 << KEY_BITS) - 1)
+    keys = (
+        (cells[:, 0] << 2 * KEY_BITS) | (cells[:, 1] << KEY_BITS) | cells[:, 2]
+    )
+    _, owner, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    owner = owner.reshape(-1)
+    merged = (
+        np.stack(
+            [
+                np.bincount(owner, weights=vertices[:, axis])
+                for axis in range(3)
+            ],
+            axis=1,
+        )
+        / counts[:, None]
+    )
+
+    merged_triangles = owner[triangles]
+    a, b, c = merged_triangles.T
+    merged_triangles = merged_triangles[(a != b) & (b != c) & (a != c)]
+    # triangles between the same three cells are drawn once
+    _, first = np.unique(
+        np.sort(merged_triangles, axis=1), axis=0, return_index=True
+    )
+    merged_triangles = merged_triangles[np.sort(first)]
+    used, merged_triangles = np.unique(merged_triangles, return_inverse=True)
+    return Level(merged[used], merged_triangles.reshape(-1, 3), cell)
+
+
+def chain(vertices: Vertices, faces: np.ndarray) -> list[Level]:
+    """the full mesh followed by up to LEVELS coarser levels"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    levels = [Level(vertices, triangulate(faces), 0.0)]
+    if len(levels[0].triangles) < MIN_TRIANGLES:
+        return levels
+    cell = mean_edge(vertices, levels[0].triangles)
+    while len(levels) <= LEVELS:
+        cell *= 2
+        level = cluster(vertices, levels[0].triangles, cell)
+        kept = len(level.triangles) / len(levels[-1].triangles)
+        if len(level.triangles) < MIN_TRIANGLES or kept > 1 - MIN_REDUCTION:
+            break
+        levels.append(level)
+    return levels
+
+
+def start_builder() -> ThreadPoolExecutor:
+    global builder
+    if builder is None:
+        builder = ThreadPoolExecutor(max_workers=1)
+    return builder
+
+
+def submit(vertices: Vertices, faces: np.ndarray) -> Future:
+    """builds chain(vertices, faces) in the background"""
+    return start_builder().submit(chain, vertices, faces)
+
+
+def when_built(callback: Callable[[], None]) -> Future:
+    """calls callback on the builder's thread once every chain submitted
+    so far is built, the builder runs them one at a time in order"""
+    return start_builder().submit(callback)
+
+
+def pick(cells: list[float], pixel: float, pixels: float) -> int:
+    """the coarsest level whose cells are at most pixels pixels of pixel
+    world units across"""
+    level = 0
+    for index, cell in enumerate(cells):
+        if cell <= pixels * pixel:
+            level = index
+    return level
@@ -1,9 +1,17 @@
-from typing import Annotated, Any
+from typing import Annotated, Any, Callable, Iterable, Iterator
+from collections.abc import MutableMapping
+from concurrent.futures import Future
+from dataclasses import dataclass
 from random import choice
 from string import ascii_letters, digits
+from itertools import count
 from pathlib import Path
-from copy import deepcopy
+from enum import Enum
+from mesh import scene_file, compression, parallel_load, lod
+from mesh.journal import Journal, COMPACT_THRESHOLD, is_journal
 import proto.mesh_pb2
+import os
+from vtkmodules.util.numpy_support import vtk_to_numpy
 import vedo
 import struct
 import numpy as np
@@ -16,13 +24,307 @@ RGB = Annotated[np.ndarray[Any, np.dtype[np.float64]], "shape=(3)"]
 
 ID_LEN = 8
 
+# shared by every MeshTable so a (id, version) pair never refers to two
+# different geometries, even across loads
+GENERATIONS = count(1)
+
+
+@dataclass
+class MeshRecord:
+    """raw buffers of a mesh that has not been built into a vedo.Mesh yet,
+    the arrays can be views into a parsed message or a memory mapped file"""
+
+    vertices: Vertices
+    faces: Faces
+    color: RGB
+    # scene file the arrays are mapped from
+    path: Path | None = None
+
+    def build(self) -> vedo.Mesh:
+        return build_mesh(self.vertices, self.faces, self.color)
+
+    def converted(
+        self, vertex_dtype: type = np.float64, compact_faces: bool = False
+    ) -> "MeshRecord":
+        """the same mesh stored as vertex_dtype vertices and, with
+        compact_faces, faces in the narrowest integer type that fits"""
+        return MeshRecord(
+            np.asarray(self.vertices, dtype=vertex_dtype),
+            np.asarray(
+                self.faces,
+                dtype=face_dtype(self.faces) if compact_faces else np.int64,
+            ),
+            self.color,
+            self.path,
+        )
+
+    def detach(self) -> None:
+        """copies mapped arrays into memory so the file can be replaced"""
+        self.vertices = np.array(self.vertices)
+        self.faces = np.array(self.faces)
+        self.path = None
+
+
+class MeshTable(MutableMapping):
+    """mesh id -> vedo.Mesh
+
+    entries can be left as MeshRecords, they are built into a vedo.Mesh the
+    first time they are looked up"""
+
+    entries: dict[str, vedo.Mesh | MeshRecord]
+    # ids added or replaced and ids deleted since the last save
+    dirty: set[str]
+    removed: set[str]
+    # changes every time the table changes, and the generation each id's
+    # geometry last changed in, for caches built from the meshes
+    generation: int
+    versions: dict[str, int]
+    # (lower, upper) corners of each mesh's axis aligned bounds, found on
+    # first use and dropped when its geometry changes
+    bounds: dict[str, tuple[Vertex, Vertex]]
+    # finished level of detail chains and the ones building in the
+    # background, with the version of the mesh they are built from
+    lods: dict[str, tuple[int, list[lod.Level]]]
+    lod_builds: dict[str, tuple[int, Future]]
+    # vedo.Meshes of decimated levels, built the first time they are drawn
+    level_meshes: dict[tuple[str, int], vedo.Mesh]
+    # counts finished chains, frames drawn before and after differ
+    lod_version: int
+
+    def __init__(self):
+        self.entries = {}
+        self.dirty = set()
+        self.removed = set()
+        self.generation = next(GENERATIONS)
+        self.versions = {}
+        self.bounds = {}
+        self.lods = {}
+        self.lod_builds = {}
+        self.level_meshes = {}
+        self.lod_version = 0
+
+    def __getitem__(self, id: str) -> vedo.Mesh:
+        entry = self.entries[id]
+        if isinstance(entry, MeshRecord):
+            entry = entry.build()
+            self.entries[id] = entry
+        return entry
+
+    def __setitem__(self, id: str, mesh: vedo.Mesh) -> None:
+        self.entries[id] = mesh
+        self.dirty.add(id)
+        self.removed.discard(id)
+        self.touch(id)
+
+    def __delitem__(self, id: str) -> None:
+        del self.entries[id]
+        self.dirty.discard(id)
+        self.removed.add(id)
+        self.versions.pop(id, None)
+        self.forget(id)
+        self.generation = next(GENERATIONS)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, id: object) -> bool:
+        return id in self.entries
+
+    def clear(self) -> None:
+        # MutableMapping.clear pops through __getitem__ and would build
+        # every lazy entry on its way out
+        self.removed.update(self.entries)
+        self.dirty.clear()
+        self.entries.clear()
+        self.versions.clear()
+        self.bounds.clear()
+        self.lods.clear()
+        self.lod_builds.clear()
+        self.level_meshes.clear()
+        self.generation = next(GENERATIONS)
+
+    def touch(self, id: str) -> None:
+        """records that the geometry of id changed"""
+        self.generation = next(GENERATIONS)
+        self.versions[id] = self.generation
+        self.forget(id)
+
+    def forget(self, id: str) -> None:
+        """drops what was derived from the geometry of id"""
+        self.bounds.pop(id, None)
+        self.lods.pop(id, None)
+        self.lod_builds.pop(id, None)
+        for level in [key for key in self.level_meshes if key[0] == id]:
+            del self.level_meshes[level]
+
+    def aabb(self, id: str) -> tuple[Vertex, Vertex]:
+        """lower and upper corners of the vertices of id, inf and -inf for
+        a mesh without any, lazy entries are not built"""
+        cached = self.bounds.get(id)
+        if cached is None:
+            # MeshRecords and vedo.Meshes both have vertices
+            vertices = np.asarray(self.entries[id].vertices, np.float64)
+            cached = self.bounds[id] = (
+                vertices.min(axis=0, initial=np.inf),
+                vertices.max(axis=0, initial=-np.inf),
+            )
+        return cached
+
+    def version(self, id: str) -> int:
+        return self.versions[id]
+
+    def levels(self, id: str, wait: bool = False) -> list[lod.Level] | None:
+        """the level of detail chain of id, None while it is built in the
+        background (asking the first time starts it) unless wait"""
+        finished = self.finished_levels(id)
+        if finished is not None:
+            return finished
+        version = self.versions[id]
+        build = self.lod_builds.get(id)
+        if build is None or build[0] != version:
+            record = self.record(id)
+            build = self.lod_builds[id] = (
+                version,
+                lod.submit(
+                    scene_file.unmapped(record.vertices),
+                    scene_file.unmapped(record.faces, np.int64),
+                ),
+            )
+        if not wait and not build[1].done():
+            return None
+        del self.lod_builds[id]
+        self.lods[id] = (version, build[1].result())
+        self.lod_version += 1
+        return self.lods[id][1]
+
+    def finished_levels(self, id: str) -> list[lod.Level] | None:
+        """the chain of id if it is built and up to date"""
+        done = self.lods.get(id)
+        if done is None or done[0] != self.versions[id]:
+            return None
+        return done[1]
+
+    def level_mesh(self, id: str, level: int) -> vedo.Mesh:
+        """the vedo.Mesh of a level of id, level 0 is the mesh itself"""
+        levels = self.finished_levels(id)
+        if level == 0 or levels is None:
+            return self[id]
+        mesh = self.level_meshes.get((id, level))
+        if mesh is None:
+            entry = self.entries[id]
+            color = (
+                entry.color
+                if isinstance(entry, MeshRecord)
+                else np.asarray(entry.color(), dtype=np.float64)
+            )
+            chosen = levels[level]
+            mesh = self.level_meshes[(id, level)] = build_mesh(
+                chosen.vertices, chosen.triangles, color
+            )
+        return mesh
+
+    def mark_clean(self) -> None:
+        self.dirty.clear()
+        self.removed.clear()
+
+    def set_lazy(self, id: str, record: MeshRecord) -> None:
+        self.entries[id] = record
+        self.touch(id)
+
+    def is_loaded(self, id: str) -> bool:
+        return not isinstance(self.entries[id], MeshRecord)
+
+    def is_ragged(self, id: str) -> bool:
+        """whether the faces of id mix polygon sizes, its record holds
+        them fanned into triangles"""
+        entry = self.entries[id]
+        return not isinstance(entry, MeshRecord) and ragged_faces(entry)
+
+    def record(self, id: str) -> MeshRecord:
+        """raw buffers of a mesh without building it"""
+        entry = self.entries[id]
+        if isinstance(entry, MeshRecord):
+            return entry
+        return MeshRecord(*mesh_arrays(entry))
+
+    def materialize(self, ids: Iterable[str] | None = None) -> None:
+        for id in self.entries if ids is None else ids:
+            self[id]
+
+    def detach(self, path: Path) -> None:
+        for entry in self.entries.values():
+            if isinstance(entry, MeshRecord) and entry.path == path:
+                entry.detach()
+
 
 class Meshes:
-    meshes: dict[str, vedo.Mesh] = {}
+    class Format(Enum):
+        # length prefixed mesh.proto Mesh messages
+        STREAM = 1
+        # SceneIndex header and aligned raw arrays, see scene_file
+        INDEXED = 2
+        # individually compressed Mesh messages, see compression
+        COMPRESSED = 3
+        # append only Mesh messages and tombstones, see journal
+        JOURNAL = 4
+
+    meshes: MeshTable
+    # journal last saved or loaded, journal saves to its path only append
+    # what changed since
+    journal: Journal | None
+
+    def __init__(self):
+        self.meshes = MeshTable()
+        self.journal = None
+
+    def materialize(self, ids: Iterable[str] | None = None) -> None:
+        """builds the vedo.Mesh of every id in ids (all lazy entries when
+        ids is None) up front instead of on first access"""
+        self.meshes.materialize(ids)
+
+    @property
+    def version(self) -> int:
+        """changes whenever meshes are added, replaced, removed or marked
+        dirty, and differs between Meshes"""
+        return self.meshes.generation
+
+    def bounds(
+        self, ids: list[str] | None = None
+    ) -> tuple[Vertices, Vertices]:
+        """(M, 3) lower and upper corners of the axis aligned bounds of the
+        meshes in ids (every mesh when None), cached until they change"""
+        if ids is None:
+            ids = list(self.meshes)
+        lower = np.empty((len(ids), 3), dtype=np.float64)
+        upper = np.empty((len(ids), 3), dtype=np.float64)
+        for row, id in enumerate(ids):
+            lower[row], upper[row] = self.meshes.aabb(id)
+        return lower, upper
+
+    @property
+    def lod_version(self) -> int:
+        """changes whenever a level of detail chain becomes ready"""
+        return self.meshes.lod_version
+
+    def build_lods(self, ids: Iterable[str] | None = None) -> None:
+        """builds the level of detail chains of ids (every mesh when None)
+        now instead of in the background when they are first drawn"""
+        for id in list(self.meshes) if ids is None else ids:
+            self.meshes.levels(id)
+        for id in list(self.meshes) if ids is None else ids:
+            self.meshes.levels(id, wait=True)
+
+    def mark_dirty(self, id: str) -> None:
+        """flags a mesh changed in place so the next journal save writes it
+        and caches of its geometry are rebuilt"""
+        self.meshes.dirty.add(id)
+        self.meshes.touch(id)
 
     def add_mesh(self, vertices: Vertices, faces: Faces, color: RGB) -> None:
-        mesh = vedo.Mesh([vertices, faces], c=vedo.colors.get_color(color))  # type: ignore
-        self.meshes[self.gen_id(ID_LEN)] = mesh
+        self.meshes[self.gen_id(ID_LEN)] = build_mesh(vertices, faces, color)
 
     def gen_id(self, len: int) -> str:
         while True:
@@ -33,12 +335,19 @@ class Meshes:
                 return new_id
 
     def serialize_mesh(self, id: str, mesh: vedo.Mesh) -> bytes:
+        return self.serialize_record(id, MeshRecord(*mesh_arrays(mesh)))
+
+    def serialize_record(self, id: str, record: MeshRecord) -> bytes:
         protobuf = proto.mesh_pb2.Mesh()  # type: ignore
 
-        vertices: Vertices = np.array(mesh.vertices, dtype=np.float64)
-        faces: Faces = np.array(mesh.cells, dtype=np.int64)
+        vertices = np.ascontiguousarray(record.vertices)
+        faces = np.ascontiguousarray(record.faces)
+        color = np.asarray(record.color, dtype=np.float64)
 
         protobuf.id = id
+        protobuf.version = scene_file.MESH_VERSION
+        protobuf.vertices_dtype = scene_file.to_proto_dtype(vertices.dtype)
+        protobuf.faces_dtype = scene_file.to_proto_dtype(faces.dtype)
 
         protobuf.vertices_shape.row = vertices.shape[0]
         protobuf.vertices_shape.col = vertices.shape[1]
@@ -48,62 +357,334 @@ class Meshes:
         protobuf.faces_shape.col = faces.shape[1]
         protobuf.faces = faces.tobytes()
 
-        protobuf.color = np.array(mesh.color(), np.float64).tobytes()
+        protobuf.color = color.tobytes()
 
         return protobuf.SerializeToString()
 
     def deserialize_mesh(self, serialized_mesh: bytes) -> None:
-        protobuf = proto.mesh_pb2.Mesh()  # type: ignore
-        protobuf.ParseFromString(serialized_mesh)
+        id, record = parse_record(serialized_mesh)
+        self.meshes[id] = record.build()
 
-        vertices: Vertices = np.frombuffer(protobuf.vertices, dtype=np.float64)
-        vertices = vertices.reshape(
-            (protobuf.vertices_shape.row, protobuf.vertices_shape.col)
-        )
+    def save(
+        self,
+        path: Path,
+        format: Format = Format.INDEXED,
+        vertex_dtype: type = np.float64,
+        compact_faces: bool = False,
+        codec: compression.Codec | None = None,
+        workers: int | None = None,
+        compact_threshold: float = COMPACT_THRESHOLD,
+    ) -> bool:
+        """writes the scene to path
 
-        faces: Faces = np.frombuffer(protobuf.faces, dtype=np.int64)
-        faces = faces.reshape(
-            (protobuf.faces_shape.row, protobuf.faces_shape.col)
-        )
-
-        color: RGB = np.frombuffer(protobuf.color, dtype=np.float64)
+        vertex_dtype can be np.float32 to halve the size of the vertices,
+        compact_faces stores faces in the narrowest integer type that fits
+        their indices
 
-        mesh = vedo.Mesh([vertices, faces], c=vedo.colors.get_color(color))  # type: ignore
+        codec compresses Format.COMPRESSED records (zlib when None) on a
+        pool of workers threads and Format.JOURNAL records when given
 
-        self.meshes[protobuf.id] = mesh
+        a Format.JOURNAL save to the journal last saved or loaded only
+        appends changed meshes and tombstones, the journal is rewritten
+        once more than compact_threshold of it is garbage"""
+        if format == self.Format.JOURNAL and self.appendable(path):
+            try:
+                self.append_journal(vertex_dtype, compact_faces)
+            except Exception as e:
+                self.journal = None
+                print(f"[ERROR] failed to save mesh to {path.absolute()}: {e}")
+                return False
+            if self.journal.garbage() <= compact_threshold:  # type: ignore
+                self.meshes.mark_clean()
+                return True
+            codec = self.journal.codec  # type: ignore
 
-    def save(self, path: Path) -> bool:
+        # write next to the destination and swap it in so a failed save
+        # never leaves a truncated file behind
+        temp = path.with_name(path.name + ".tmp")
+        journal: Journal | None = None
         try:
-            with path.open("wb") as file:
-                for id in self.meshes:
-                    serialized_mesh: bytes = self.serialize_mesh(
-                        id, self.meshes[id]
-                    )
-                    file.write(struct.pack("<I", len(serialized_mesh)))
-                    file.write(serialized_mesh)
+            if format == self.Format.JOURNAL:
+                journal = Journal(temp, codec)
+                journal.write(
+                    (id, self.serialize_record(id, record))
+                    for id, record in self.records(vertex_dtype, compact_faces)
+                )
+                journal.path = path
+            elif format == self.Format.INDEXED:
+                scene_file.write(
+                    temp,
+                    (
+                        (id, record.vertices, record.faces, record.color)
+                        for id, record in self.records(
+                            vertex_dtype, compact_faces
+                        )
+                    ),
+                )
+            elif format == self.Format.COMPRESSED:
+                compression.write(
+                    temp,
+                    (
+                        self.serialize_record(id, record)
+                        for id, record in self.records(
+                            vertex_dtype, compact_faces
+                        )
+                    ),
+                    codec or compression.Codec.ZLIB,
+                    workers=workers,
+                )
+            else:
+                with temp.open("wb") as file:
+                    for id, record in self.records(
+                        vertex_dtype, compact_faces
+                    ):
+                        serialized_mesh: bytes = self.serialize_record(
+                            id, record
+                        )
+                        file.write(struct.pack("<I", len(serialized_mesh)))
+                        file.write(serialized_mesh)
+            # lazy entries may still be mapped from the file being replaced
+            self.meshes.detach(path)
+            os.replace(temp, path)
         except Exception as e:
+            temp.unlink(missing_ok=True)
             print(f"[ERROR] failed to save mesh to {path.absolute()}: {e}")
             return False
+        self.journal = journal
+        self.meshes.mark_clean()
         return True
 
-    def load(self, path: Path) -> bool:
-        self.meshes.clear()
+    def appendable(self, path: Path) -> bool:
+        return (
+            self.journal is not None
+            and self.journal.path == path
+            and path.exists()
+        )
+
+    def append_journal(
+        self, vertex_dtype: type = np.float64, compact_faces: bool = False
+    ) -> None:
+        journal: Journal = self.journal  # type: ignore
+        journal.append(
+            (
+                (
+                    id,
+                    self.serialize_record(
+                        id,
+                        self.meshes.record(id).converted(
+                            vertex_dtype, compact_faces
+                        ),
+                    ),
+                )
+                for id in self.meshes.dirty
+                if id in self.meshes
+            ),
+            [id for id in self.meshes.removed if id in journal.live],
+        )
+
+    def compact(self) -> bool:
+        """rewrites the current journal with only its live records"""
+        if self.journal is None:
+            return False
+        path, codec = self.journal.path, self.journal.codec
+        self.journal = None
+        return self.save(path, self.Format.JOURNAL, codec=codec)
+
+    def records(
+        self, vertex_dtype: type = np.float64, compact_faces: bool = False
+    ) -> Iterator[tuple[str, MeshRecord]]:
+        for id in self.meshes:
+            yield id, self.meshes.record(id).converted(
+                vertex_dtype, compact_faces
+            )
+
+    def detect_format(self, path: Path) -> Format:
+        if scene_file.is_indexed(path):
+            return self.Format.INDEXED
+        if compression.is_compressed(path):
+            return self.Format.COMPRESSED
+        if is_journal(path):
+            return self.Format.JOURNAL
+        return self.Format.STREAM
+
+    def stream(
+        self,
+        path: Path,
+        progress: Callable[[int, int], None] | None = None,
+        cancel: Callable[[], bool] | None = None,
+        workers: int | None = None,
+        processes: int = 0,
+    ) -> Iterator[scene_file.Record]:
+        """yields (id, vertices, faces, color) for every mesh in the scene
+        at path one at a time without adding them to self.meshes
+
+        progress is called with (bytes read, total bytes) after every
+        record and reading stops early once cancel returns True
+
+        with processes, stream files and uncompressed journals are parsed
+        on that many worker processes, see parallel_load"""
+        total = path.stat().st_size
+        format = self.detect_format(path)
+        spans: list[parallel_load.Span] | None = None
+        if processes > 0 and format == self.Format.STREAM:
+            spans = parallel_load.scan_stream(path)
+        elif processes > 0 and format == self.Format.JOURNAL:
+            journal = Journal.replay(path)
+            if journal.codec is None:
+                spans = [(start, size) for _, start, size in journal.spans()]
+
+        records: Iterator[tuple[str, MeshRecord, int]]
+        if spans is not None:
+            records = (
+                (id, MeshRecord(vertices, faces, color), end)
+                for (id, vertices, faces, color), end in parallel_load.read(
+                    path, spans, processes
+                )
+            )
+        elif format == self.Format.INDEXED:
+            records = (
+                (id, MeshRecord(vertices, faces, color, path), end)
+                for (id, vertices, faces, color), end in scene_file.read(path)
+            )
+        elif format == self.Format.JOURNAL:
+            records = (
+                (*parse_record(serialized_mesh), end)
+                for _, serialized_mesh, end in Journal.replay(path).read()
+            )
+        elif format == self.Format.COMPRESSED:
+            records = (
+                (*parse_record(serialized_mesh), end)
+                for serialized_mesh, end in compression.read(path, workers)
+            )
+        else:
+            records = read_stream(path)
+
+        for id, record, end in records:
+            if cancel is not None and cancel():
+                return
+            yield id, record.vertices, record.faces, record.color
+            if progress is not None:
+                progress(end, total)
+
+    def load(
+        self,
+        path: Path,
+        lazy: bool = True,
+        workers: int | None = None,
+        progress: Callable[[int, int], None] | None = None,
+        cancel: Callable[[], bool] | None = None,
+        processes: int = 0,
+    ) -> bool:
+        """reads the scene at path, with lazy the meshes are only built
+        when first looked up in self.meshes
+
+        compressed scenes are decompressed on a pool of workers threads,
+        progress, cancel and processes are passed on to stream. the current
+        scene is only replaced once the whole file was read, the vedo.Mesh
+        objects are always built on the calling thread"""
+        meshes = MeshTable()
         try:
-            with path.open("rb") as file:
-                while True:
-                    size_data = file.read(4)
-                    if not size_data:
-                        break
-                    size: int = struct.unpack("<I", size_data)[0]
-                    serialized_mesh: bytes = file.read(size)
-                    self.deserialize_mesh(serialized_mesh)
+            format = self.detect_format(path)
+            indexed = format == self.Format.INDEXED
+            for id, vertices, faces, color in self.stream(
+                path, progress, cancel, workers, processes
+            ):
+                meshes.set_lazy(
+                    id,
+                    MeshRecord(
+                        vertices, faces, color, path if indexed else None
+                    ),
+                )
+            if cancel is not None and cancel():
+                return False
+            self.journal = None
+            if format == self.Format.JOURNAL:
+                self.journal = Journal.replay(path)
         except Exception as e:
             print(f"[ERROR] failed to load mesh to {path.absolute()}: {e}")
             return False
+        self.meshes = meshes
+        if not lazy:
+            self.materialize()
         return True
 
 
-def copy_mesh(mesh: Meshes) -> Meshes:
-    new_mesh = Meshes()
-    new_mesh.meshes = deepcopy(mesh.meshes)
-    return new_mesh
+def parse_record(serialized_mesh: bytes) -> tuple[str, MeshRecord]:
+    id, vertices, faces, color = scene_file.decode_mesh(serialized_mesh)
+    return id, MeshRecord(vertices, faces, color)
+
+
+def read_stream(path: Path) -> Iterator[tuple[str, MeshRecord, int]]:
+    """yields (id, record, end of record in file) from a stream of length
+    prefixed Mesh messages"""
+    with path.open("rb") as file:
+        while True:
+            size_data = file.read(4)
+            if not size_data:
+                break
+            if len(size_data) < 4:
+                raise ValueError(f"truncated record at {file.tell()}")
+            size: int = struct.unpack("<I", size_data)[0]
+            serialized_mesh: bytes = file.read(size)
+            if len(serialized_mesh) < size:
+                raise ValueError(f"truncated record at {file.tell()}")
+            yield *parse_record(serialized_mesh), file.tell()
+
+
+def build_mesh(vertices: Vertices, faces: Faces, color: RGB) -> vedo.Mesh:
+    faces = np.asarray(faces, dtype=np.int64)
+    return vedo.Mesh([vertices, faces], c=vedo.colors.get_color(color))  # type: ignore
+
+
+def face_dtype(faces: Faces) -> np.dtype:
+    """narrowest integer type that holds every index in faces"""
+    largest = int(np.max(faces)) if np.size(faces) else 0
+    for dtype in (np.uint16, np.uint32):
+        if largest <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def mesh_faces(mesh: vedo.Mesh) -> Faces:
+    """reads faces straight from the VTK cell array instead of going
+    through a python list. faces that mix polygon sizes have no (N, k)
+    array, they are fanned into triangles"""
+    polys = mesh.dataset.GetPolys()
+    offsets = vtk_to_numpy(polys.GetOffsetsArray())
+    sizes = np.diff(offsets)
+    if len(sizes) == 0:
+        return np.asarray(mesh.cells, dtype=np.int64)
+    connectivity = vtk_to_numpy(polys.GetConnectivityArray())
+    if np.any(sizes != sizes[0]):
+        return fan_triangles(connectivity, offsets)
+    return connectivity.reshape(-1, sizes[0]).astype(np.int64, copy=False)
+
+
+def ragged_faces(mesh: vedo.Mesh) -> bool:
+    """whether the faces of mesh mix polygon sizes"""
+    sizes = np.diff(vtk_to_numpy(mesh.dataset.GetPolys().GetOffsetsArray()))
+    return len(sizes) > 0 and bool(np.any(sizes != sizes[0]))
+
+
+def fan_triangles(connectivity: np.ndarray, offsets: np.ndarray) -> Faces:
+    """(T, 3) triangles fanned from the first corner of every polygon of a
+    VTK cell array, polygon i is connectivity[offsets[i]:offsets[i + 1]]"""
+    fans = np.maximum(np.diff(offsets) - 2, 0)
+    starts = np.repeat(offsets[:-1], fans)
+    # index of every triangle within its polygon's fan
+    corners = np.arange(len(starts)) - np.repeat(np.cumsum(fans) - fans, fans)
+    return np.stack(
+        [
+            connectivity[starts],
+            connectivity[starts + corners + 1],
+            connectivity[starts + corners + 2],
+        ],
+        axis=1,
+    ).astype(np.int64, copy=False)
+
+
+def mesh_arrays(mesh: vedo.Mesh) -> tuple[Vertices, Faces, RGB]:
+    vertices: Vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces: Faces = mesh_faces(mesh)
+    color: RGB = np.asarray(mesh.color(), dtype=np.float64)
+    return vertices, faces, color
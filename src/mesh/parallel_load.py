@@ -0,0 +1,168 @@
+"""decodes length prefixed Mesh records on a pool of processes
+
+the parent finds where every record is in the file and splits the records
+into batches, each batch gets a block of shared memory big enough for its
+arrays (they are never larger than the serialized messages). workers read
+and parse their records and write the arrays into the block, only ids,
+shapes, dtypes and offsets are pickled back. the parent copies the arrays
+out of the block and frees it, so nothing outlives the load"""
+
+from typing import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import deque
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from mesh import scene_file
+import struct
+import sys
+import numpy as np
+
+SIZE = struct.Struct("<I")
+
+# batches handed out per worker, more batches balance uneven records
+BATCHES_PER_WORKER = 4
+
+# (offset in file, size) of a serialized Mesh
+Span = tuple[int, int]
+# (offset in block, shape, dtype)
+ArrayInfo = tuple[int, tuple[int, ...], str]
+
+
+def scan_stream(path: Path) -> list[Span]:
+    """where every record of a stream file is, only the size prefixes are
+    read"""
+    spans: list[Span] = []
+    file_size = path.stat().st_size
+    with path.open("rb") as file:
+        while True:
+            size_data = file.read(SIZE.size)
+            if not size_data:
+                break
+            if len(size_data) < SIZE.size:
+                raise ValueError(f"truncated record at {file.tell()}")
+            size: int = SIZE.unpack(size_data)[0]
+            if file.tell() + size > file_size:
+                raise ValueError(f"truncated record at {file.tell()}")
+            spans.append((file.tell(), size))
+            file.seek(size, 1)
+    return spans
+
+
+def batch_spans(spans: list[Span], batches: int) -> list[list[Span]]:
+    """splits spans into about batches runs of similar byte size"""
+    target = sum(size for _, size in spans) / max(batches, 1)
+    result: list[list[Span]] = [[]]
+    batch_size = 0
+    for span in spans:
+        if result[-1] and batch_size >= target:
+            result.append([])
+            batch_size = 0
+        result[-1].append(span)
+        batch_size += span[1]
+    return [batch for batch in result if batch]
+
+
+def block_size(batch: list[Span]) -> int:
+    # both arrays of a record may need padding to the next alignment
+    return sum(size + 2 * scene_file.ALIGNMENT for _, size in batch)
+
+
+def attach(name: str) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # the pool's workers share the parent's resource tracker, registering
+    # the name again is a no op and the parent unregisters it on unlink
+    return SharedMemory(name=name)
+
+
+def write_array(block: SharedMemory, offset: int, array: np.ndarray) -> None:
+    view = np.ndarray(
+        array.shape, array.dtype, buffer=block.buf, offset=offset
+    )
+    view[...] = array
+
+
+def read_array(block: SharedMemory, info: ArrayInfo) -> np.ndarray:
+    offset, shape, dtype = info
+    view = np.ndarray(shape, np.dtype(dtype), buffer=block.buf, offset=offset)
+    return view.copy()
+
+
+def decode_batch(
+    path: Path, batch: list[Span], block_name: str
+) -> list[tuple[str, ArrayInfo, ArrayInfo, bytes]]:
+    """runs in the workers, parses the records in batch and writes their
+    arrays into the shared block"""
+    block = attach(block_name)
+    results: list[tuple[str, ArrayInfo, ArrayInfo, bytes]] = []
+    offset = 0
+    try:
+        with path.open("rb") as file:
+            for start, size in batch:
+                file.seek(start)
+                id, vertices, faces, color = scene_file.decode_mesh(
+                    file.read(size)
+                )
+                infos: list[ArrayInfo] = []
+                for array in (vertices, faces):
+                    write_array(block, offset, array)
+                    infos.append((offset, array.shape, array.dtype.str))
+                    offset = scene_file.align(offset + array.nbytes)
+                results.append((id, infos[0], infos[1], color.tobytes()))
+    finally:
+        block.close()
+    return results
+
+
+def read(
+    path: Path, spans: list[Span], processes: int
+) -> Iterator[tuple[scene_file.Record, int]]:
+    """yields (record, end of record in file) for the serialized Meshes at
+    spans in path in order, decoded on processes worker processes"""
+    batches = batch_spans(spans, processes * BATCHES_PER_WORKER)
+    pending: deque[tuple[list[Span], SharedMemory, Future]] = deque()
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_context("spawn")
+    ) as pool:
+        try:
+            for batch in batches:
+                # at most two batches per worker hold shared memory
+                while len(pending) >= 2 * processes:
+                    yield from collect(*pending.popleft())
+                block = SharedMemory(create=True, size=block_size(batch))
+                pending.append(
+                    (
+                        batch,
+                        block,
+                        pool.submit(decode_batch, path, batch, block.name),
+                    )
+                )
+            while pending:
+                yield from collect(*pending.popleft())
+        finally:
+            pool.shutdown(cancel_futures=True)
+            for _, block, _ in pending:
+                block.close()
+                block.unlink()
+
+
+def collect(
+    batch: list[Span], block: SharedMemory, future: Future
+) -> Iterator[tuple[scene_file.Record, int]]:
+    try:
+        results = future.result()
+        records = [
+            (
+                id,
+                read_array(block, vertices),
+                read_array(block, faces),
+                np.frombuffer(color, dtype=np.float64),
+            )
+            for id, vertices, faces, color in results
+        ]
+    finally:
+        block.close()
+        block.unlink()
+    for record, (start, size) in zip(records, batch):
+        yield record, start + size
@@ -0,0 +1,195 @@
+"""indexed scene files
+
+a small fixed header, a protobuf SceneIndex describing where every mesh's
+arrays live, then a data section of raw little endian arrays each aligned
+to ALIGNMENT bytes so they can be memory mapped without parsing or copying
+
+    magic (8 bytes) | index size (uint64) | SceneIndex | padding | data"""
+
+from typing import Iterable, Iterator
+import mmap
+from pathlib import Path
+import proto.mesh_pb2
+import struct
+import numpy as np
+
+MAGIC = b"SKWSCENE"
+VERSION = 1
+# version written into mesh.proto Mesh messages, 0 is the original format
+# without dtype fields
+MESH_VERSION = 1
+ALIGNMENT = 64
+HEADER = struct.Struct("<8sQ")
+
+DTYPES: dict[int, np.dtype] = {
+    proto.mesh_pb2.FLOAT64: np.dtype("<f8"),  # type: ignore
+    proto.mesh_pb2.FLOAT32: np.dtype("<f4"),  # type: ignore
+    proto.mesh_pb2.INT64: np.dtype("<i8"),  # type: ignore
+    proto.mesh_pb2.INT32: np.dtype("<i4"),  # type: ignore
+    proto.mesh_pb2.UINT32: np.dtype("<u4"),  # type: ignore
+    proto.mesh_pb2.UINT16: np.dtype("<u2"),  # type: ignore
+}
+
+# (id, vertices, faces, color)
+Record = tuple[str, np.ndarray, np.ndarray, np.ndarray]
+
+
+def align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def to_proto_dtype(dtype: np.dtype) -> int:
+    for proto_dtype in DTYPES:
+        if DTYPES[proto_dtype] == dtype.newbyteorder("<"):
+            return proto_dtype
+    raise ValueError(f"unsupported dtype {dtype}")
+
+
+def decode_mesh(serialized_mesh: bytes) -> Record:
+    """arrays of a serialized mesh.proto Mesh, used by every format that
+    stores Mesh messages"""
+    protobuf = proto.mesh_pb2.Mesh()  # type: ignore
+    protobuf.ParseFromString(serialized_mesh)
+    if protobuf.version > MESH_VERSION:
+        raise ValueError(f"unsupported mesh version {protobuf.version}")
+
+    # version 0 messages leave the dtypes unspecified
+    vertices_dtype = DTYPES.get(protobuf.vertices_dtype, np.dtype("<f8"))
+    faces_dtype = DTYPES.get(protobuf.faces_dtype, np.dtype("<i8"))
+
+    vertices = np.frombuffer(protobuf.vertices, dtype=vertices_dtype)
+    vertices = vertices.reshape(
+        (protobuf.vertices_shape.row, protobuf.vertices_shape.col)
+    )
+
+    faces = np.frombuffer(protobuf.faces, dtype=faces_dtype)
+    faces = faces.reshape((protobuf.faces_shape.row, protobuf.faces_shape.col))
+
+    color = np.frombuffer(protobuf.color, dtype=np.float64)
+
+    return protobuf.id, vertices, faces, color
+
+
+def is_indexed(path: Path) -> bool:
+    with path.open("rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def write(path: Path, records: Iterable[Record]) -> None:
+    """writes records to path, the arrays are written straight from their
+    buffers after the index"""
+    index = proto.mesh_pb2.SceneIndex()  # type: ignore
+    index.version = VERSION
+    arrays: list[np.ndarray] = []
+    offset = 0
+
+    def add_array(info, array: np.ndarray) -> None:
+        nonlocal offset
+        array = np.ascontiguousarray(array, array.dtype.newbyteorder("<"))
+        info.offset = offset
+        info.shape.row = array.shape[0]
+        info.shape.col = array.shape[1] if array.ndim > 1 else 1
+        info.dtype = to_proto_dtype(array.dtype)
+        arrays.append(array)
+        offset = align(offset + array.nbytes)
+
+    for id, vertices, faces, color in records:
+        entry = index.meshes.add()
+        entry.id = id
+        add_array(entry.vertices, vertices)
+        add_array(entry.faces, faces)
+        entry.color = np.asarray(color, dtype=np.float64).tobytes()
+
+    serialized_index: bytes = index.SerializeToString()
+    data_start = align(HEADER.size + len(serialized_index))
+    with path.open("wb") as file:
+        file.write(HEADER.pack(MAGIC, len(serialized_index)))
+        file.write(serialized_index)
+        file.write(bytes(data_start - file.tell()))
+        for array in arrays:
+            file.write(memoryview(array).cast("B"))
+            file.write(bytes(align(array.nbytes) - array.nbytes))
+
+
+def read_index(path: Path) -> tuple[proto.mesh_pb2.SceneIndex, int]:  # type: ignore
+    """returns the index of the file and the offset of its data section"""
+    with path.open("rb") as file:
+        magic, size = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path.absolute()} is not an indexed scene")
+        index = proto.mesh_pb2.SceneIndex()  # type: ignore
+        index.ParseFromString(file.read(size))
+    if index.version > VERSION:
+        raise ValueError(f"unsupported scene version {index.version}")
+    return index, align(HEADER.size + size)
+
+
+def map_file(path: Path) -> mmap.mmap:
+    """read only mapping of the whole file, one per load however many
+    arrays are viewed through it"""
+    with path.open("rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def map_array(buffer: mmap.mmap, info, data_start: int) -> np.ndarray:
+    """read only view of an array in the mapped file, nothing is read
+    until the pages are touched. the view keeps the mapping alive"""
+    shape = (info.shape.row, info.shape.col)
+    dtype = DTYPES[info.dtype]
+    if info.shape.row * info.shape.col == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.frombuffer(
+        buffer,
+        dtype=dtype,
+        count=info.shape.row * info.shape.col,
+        offset=data_start + info.offset,
+    ).reshape(shape)
+
+
+def array_end(info, data_start: int) -> int:
+    """end of the array and its padding in the file"""
+    size = info.shape.row * info.shape.col * DTYPES[info.dtype].itemsize
+    return data_start + align(info.offset + size)
+
+
+def read(path: Path) -> Iterator[tuple[Record, int]]:
+    """yields (record, end of its arrays in file) for every mesh in path"""
+    index, data_start = read_index(path)
+    if len(index.meshes) == 0:
+        return
+    # a mapping per array would hold a file descriptor per array
+    buffer = map_file(path)
+    for entry in index.meshes:
+        record = (
+            entry.id,
+            map_array(buffer, entry.vertices, data_start),
+            map_array(buffer, entry.faces, data_start),
+            np.frombuffer(entry.color, dtype=np.float64),
+        )
+        yield record, max(
+            array_end(entry.vertices, data_start),
+            array_end(entry.faces, data_start),
+        )
+
+
+def is_mapped(array: np.ndarray) -> bool:
+    """whether array is a view of a memory mapped file"""
+    base = array
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return True
+        if isinstance(base, memoryview):
+            # np.frombuffer views hold the mapping through a memoryview
+            base = base.obj
+        else:
+            base = getattr(base, "base", None)
+    return False
+
+
+def unmapped(array: np.ndarray, dtype: type = np.float64) -> np.ndarray:
+    """array as dtype, copied into memory when it is a view of a mapped
+    file. caches built from file arrays hold these, so the file can still
+    be replaced (Windows refuses to replace a file that is mapped)"""
+    if is_mapped(array):
+        return np.array(array, dtype=dtype)
+    return np.asarray(array, dtype=dtype)
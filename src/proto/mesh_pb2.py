@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
 # source: mesh.proto
+# Protobuf Python Version: 6.30.0
 """Generated protocol buffer code."""
-from google.protobuf.internal import builder as _builder
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
 from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    30,
+    0,
+    '',
+    'mesh.proto'
+)
 # @@protoc_insertion_point(imports)
 
 _sym_db = _symbol_database.Default()
@@ -13,15 +24,23 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nmesh.proto\"!\n\x05Shape\x12\x0b\n\x03row\x18\x01 \x01(\r\x12\x0b\n\x03\x63ol\x18\x02 \x01(\r\"\x7f\n\x04Mesh\x12\n\n\x02id\x18\x01 \x01(\t\x12\x1e\n\x0evertices_shape\x18\x02 \x01(\x0b\x32\x06.Shape\x12\x10\n\x08vertices\x18\x03 \x01(\x0c\x12\x1b\n\x0b\x66\x61\x63\x65s_shape\x18\x04 \x01(\x0b\x32\x06.Shape\x12\r\n\x05\x66\x61\x63\x65s\x18\x05 \x01(\x0c\x12\r\n\x05\x63olor\x18\x06 \x01(\x0c\x62\x06proto3')
-
-_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
-_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'mesh_pb2', globals())
-if _descriptor._USE_C_DESCRIPTORS == False:
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nmesh.proto\"!\n\x05Shape\x12\x0b\n\x03row\x18\x01 \x01(\r\x12\x0b\n\x03\x63ol\x18\x02 \x01(\r\"\xcd\x01\n\x04Mesh\x12\n\n\x02id\x18\x01 \x01(\t\x12\x1e\n\x0evertices_shape\x18\x02 \x01(\x0b\x32\x06.Shape\x12\x10\n\x08vertices\x18\x03 \x01(\x0c\x12\x1b\n\x0b\x66\x61\x63\x65s_shape\x18\x04 \x01(\x0b\x32\x06.Shape\x12\r\n\x05\x66\x61\x63\x65s\x18\x05 \x01(\x0c\x12\r\n\x05\x63olor\x18\x06 \x01(\x0c\x12\x0f\n\x07version\x18\x07 \x01(\r\x12\x1e\n\x0evertices_dtype\x18\x08 \x01(\x0e\x32\x06.DType\x12\x1b\n\x0b\x66\x61\x63\x65s_dtype\x18\t \x01(\x0e\x32\x06.DType\"E\n\x05\x41rray\x12\x0e\n\x06offset\x18\x01 \x01(\x04\x12\x15\n\x05shape\x18\x02 \x01(\x0b\x32\x06.Shape\x12\x15\n\x05\x64type\x18\x03 \x01(\x0e\x32\x06.DType\"W\n\tMeshEntry\x12\n\n\x02id\x18\x01 \x01(\t\x12\x18\n\x08vertices\x18\x02 \x01(\x0b\x32\x06.Array\x12\x15\n\x05\x66\x61\x63\x65s\x18\x03 \x01(\x0b\x32\x06.Array\x12\r\n\x05\x63olor\x18\x04 \x01(\x0c\"9\n\nSceneIndex\x12\x0f\n\x07version\x18\x01 \x01(\r\x12\x1a\n\x06meshes\x18\x02 \x03(\x0b\x32\n.MeshEntry*f\n\x05\x44Type\x12\x15\n\x11\x44TYPE_UNSPECIFIED\x10\x00\x12\x0b\n\x07\x46LOAT64\x10\x01\x12\x0b\n\x07\x46LOAT32\x10\x02\x12\t\n\x05INT64\x10\x03\x12\t\n\x05INT32\x10\x04\x12\n\n\x06UINT32\x10\x05\x12\n\n\x06UINT16\x10\x06\x62\x06proto3')
 
-  DESCRIPTOR._options = None
-  _SHAPE._serialized_start=14
-  _SHAPE._serialized_end=47
-  _MESH._serialized_start=49
-  _MESH._serialized_end=176
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'mesh_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_DTYPE']._serialized_start=476
+  _globals['_DTYPE']._serialized_end=578
+  _globals['_SHAPE']._serialized_start=14
+  _globals['_SHAPE']._serialized_end=47
+  _globals['_MESH']._serialized_start=50
+  _globals['_MESH']._serialized_end=255
+  _globals['_ARRAY']._serialized_start=257
+  _globals['_ARRAY']._serialized_end=326
+  _globals['_MESHENTRY']._serialized_start=328
+  _globals['_MESHENTRY']._serialized_end=415
+  _globals['_SCENEINDEX']._serialized_start=417
+  _globals['_SCENEINDEX']._serialized_end=474
 # @@protoc_insertion_point(module_scope)
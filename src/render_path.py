@@ -0,0 +1,326 @@
+"""renders a saved scene along a camera path without a window and writes
+every frame as a numbered png
+
+    python src/render_path.py scene.pb path.json frames/
+    python src/render_path.py scene.pb --turntable 3600 frames/
+
+scenes are looked up in saves/ like the app does unless the path exists
+as given. a path is a json list of keyframes,
+
+    [{"frame": 0, "position": [x, y, z], "focal_point": [x, y, z],
+      "view_angle": 30, "viewup": [0, 1, 0]}, ...]
+
+each key moves in a straight line between the keyframes that set it and
+holds still before the first and after the last of them, keys no
+keyframe sets keep the viewer's default camera. --turntable circles
+the scene instead, around the y axis (the backends' default view up) or
+the one given with --axis
+
+frames are spread over a pool of processes that load the scene once and
+write their own pngs, only frame numbers go back and forth. at most
+IN_FLIGHT frames per process are queued at a time, so memory does not
+grow with the length of the path"""
+
+from argparse import ArgumentParser, Namespace
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+import json
+import os
+from PIL import Image
+import numpy as np
+from views import view_types
+from views.camera import Camera
+from views.frame_cache import FrameCache
+from views.view import Viewer
+from mesh.mesh import Meshes
+
+SAVES_DIR: Path = Path(__file__).parent.parent.joinpath("saves")
+
+# frames queued per process beyond the one it renders
+IN_FLIGHT = 2
+# camera parameters a keyframe can set
+KEYS = ("position", "focal_point", "view_angle", "viewup")
+# turntable radius as a multiple of the scene's bounding box diagonal and
+# its angle above the center, in degrees
+TURNTABLE_DISTANCE = 1.2
+TURNTABLE_ELEVATION = 30.0
+
+Keyframe = dict[str, Any]
+# key -> keyframes that set it
+Tracks = dict[str, list[Keyframe]]
+
+MODES = {
+    "rasterize": Viewer.Rendering.RASTERIZE,
+    "software": Viewer.Rendering.SOFTWARE,
+    "ray_trace": Viewer.Rendering.RAY_TRACE,
+}
+PROJECTIONS = {
+    "perspective": Viewer.Perspective.PERSPECTIVE,
+    "orthographic": Viewer.Perspective.ORTHOGRAPHIC,
+}
+
+
+def scene_path(name: str) -> Path:
+    path = Path(name)
+    return path if path.exists() else SAVES_DIR.joinpath(name)
+
+
+def read_path(path: Path) -> list[Keyframe]:
+    """the keyframes in a json file, sorted by frame"""
+    keyframes = json.loads(path.read_text())
+    if not keyframes:
+        raise ValueError(f"{path} has no keyframes")
+    for keyframe in keyframes:
+        if "frame" not in keyframe:
+            raise ValueError(f"keyframe without a frame in {path}")
+    return sorted(keyframes, key=lambda keyframe: keyframe["frame"])
+
+
+def key_tracks(keyframes: list[Keyframe]) -> Tracks:
+    """the keyframes that set each key, sorted by frame"""
+    ordered = sorted(keyframes, key=lambda keyframe: keyframe["frame"])
+    return {
+        key: [keyframe for keyframe in ordered if key in keyframe]
+        for key in KEYS
+    }
+
+
+def interpolate(tracks: Tracks, frame: int) -> Keyframe:
+    """camera parameters at frame. each key moves between the nearest
+    keyframes before and after frame that set it and holds still before
+    the first and after the last of them"""
+    values: Keyframe = {}
+    for key, setting in tracks.items():
+        after = bisect_right(
+            setting, frame, key=lambda keyframe: keyframe["frame"]
+        )
+        if 0 < after < len(setting):
+            start, end = setting[after - 1], setting[after]
+            t = (frame - start["frame"]) / (end["frame"] - start["frame"])
+            values[key] = (1 - t) * np.asarray(
+                start[key], dtype=np.float64
+            ) + t * np.asarray(end[key], dtype=np.float64)
+        elif setting:
+            values[key] = setting[min(after, len(setting) - 1)][key]
+    return values
+
+
+def turntable(meshes: Meshes, frames: int, axis: int = 1) -> list[Keyframe]:
+    """one keyframe per frame circling the scene's bounds once around
+    axis (0, 1 or 2 for x, y or z), which points up on screen"""
+    lower, upper = meshes.bounds()
+    if len(lower) == 0:
+        raise ValueError("the scene is empty")
+    low, high = lower.min(axis=0), upper.max(axis=0)
+    center = (low + high) / 2
+    distance = TURNTABLE_DISTANCE * max(float(np.linalg.norm(high - low)), 1)
+    elevation = np.deg2rad(TURNTABLE_ELEVATION)
+    up, across, along = np.eye(3)[[axis, (axis + 1) % 3, (axis + 2) % 3]]
+    keyframes: list[Keyframe] = []
+    for frame in range(frames):
+        angle = 2 * np.pi * frame / frames
+        offset = distance * (
+            np.cos(elevation)
+            * (np.cos(angle) * across + np.sin(angle) * along)
+            + np.sin(elevation) * up
+        )
+        keyframes.append(
+            {
+                "frame": frame,
+                "position": (center + offset).tolist(),
+                "focal_point": center.tolist(),
+                "viewup": up.tolist(),
+            }
+        )
+    return keyframes
+
+
+def frame_file(output: Path, frame: int, frames: int) -> Path:
+    digits = max(4, len(str(frames - 1)))
+    return output.joinpath(f"frame_{frame:0{digits}d}.png")
+
+
+# scene, viewer and default camera of this worker process, set by
+# start_worker
+worker_meshes: Meshes | None = None
+worker_viewer: Viewer | None = None
+worker_camera: Camera | None = None
+
+
+def start_worker(scene: Path, settings: dict[str, Any]) -> None:
+    global worker_meshes, worker_viewer, worker_camera
+    worker_meshes = Meshes()
+    if not worker_meshes.load(scene):
+        raise RuntimeError(f"failed to load {scene}")
+    # frames of a path are rendered once, caching them only holds memory
+    worker_viewer = Viewer(workers=1, samples=settings["samples"])
+    worker_viewer.frames = FrameCache(max_bytes=0)
+    worker_viewer.render_mode = MODES[settings["mode"]]
+    worker_viewer.view_mode = PROJECTIONS[settings["projection"]]
+    worker_camera = worker_viewer.cam.copy()
+    if worker_viewer.render_mode != Viewer.Rendering.RAY_TRACE:
+        # a frame drawn while chains build draws full meshes in place of
+        # the levels still missing, so the same frame would come out
+        # differently depending on how far the builds had got
+        worker_meshes.build_lods()
+
+
+def render_frame(
+    display: view_types.Display, camera: Keyframe, file: Path
+) -> int:
+    """renders one frame into file, returns how many meshes were culled.
+    every frame starts from the default camera, so what an earlier frame
+    on this worker set does not carry over"""
+    assert worker_meshes is not None and worker_viewer is not None
+    assert worker_camera is not None
+    cam = worker_viewer.cam = worker_camera.copy()
+    if "position" in camera:
+        cam.set_position(np.asarray(camera["position"], dtype=np.float64))
+    if "focal_point" in camera:
+        cam.set_focal_point(
+            np.asarray(camera["focal_point"], dtype=np.float64)
+        )
+    if "view_angle" in camera:
+        cam.set_view_angle(np.float64(camera["view_angle"]))
+    if "viewup" in camera:
+        cam.set_viewup(np.asarray(camera["viewup"], dtype=np.float64))
+    raster = worker_viewer.render(display, worker_meshes)
+    Image.fromarray(raster).save(file)
+    return worker_viewer.culled
+
+
+def render_path(
+    scene: Path,
+    keyframes: list[Keyframe],
+    frames: int,
+    output: Path,
+    display: view_types.Display,
+    settings: dict[str, Any],
+    processes: int,
+    resume: bool = False,
+) -> None:
+    """renders frames 0 to frames - 1 of the path into output"""
+    output.mkdir(parents=True, exist_ok=True)
+    todo = [
+        frame
+        for frame in range(frames)
+        if not (resume and frame_file(output, frame, frames).exists())
+    ]
+    tracks = key_tracks(keyframes)
+    start = perf_counter()
+    done = 0
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=get_context("spawn"),
+        initializer=start_worker,
+        initargs=(scene, settings),
+    ) as pool:
+        pending: dict[Future, int] = {}
+        queue = iter(todo)
+        while True:
+            for frame in queue:
+                file = frame_file(output, frame, frames)
+                camera = interpolate(tracks, frame)
+                pending[pool.submit(render_frame, display, camera, file)] = (
+                    frame
+                )
+                if len(pending) >= processes * (IN_FLIGHT + 1):
+                    break
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                frame = pending.pop(future)
+                culled = future.result()
+                done += 1
+                elapsed = perf_counter() - start
+                print(
+                    f"frame {frame} ({done}/{len(todo)}) culled {culled}, "
+                    f"{elapsed / done:.2f}s per frame"
+                )
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("scene", help="scene file, looked up in saves/")
+    parser.add_argument("path", nargs="?", help="json list of keyframes")
+    parser.add_argument("output", help="directory the pngs are written to")
+    parser.add_argument(
+        "--turntable",
+        type=int,
+        metavar="FRAMES",
+        help="circle the scene in FRAMES frames instead of following a path",
+    )
+    parser.add_argument(
+        "--axis",
+        choices=("x", "y", "z"),
+        default="y",
+        help="axis the turntable circles around",
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        help="frames to render, by default up to the last keyframe",
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--mode", choices=MODES, default="rasterize")
+    parser.add_argument(
+        "--projection", choices=PROJECTIONS, default="perspective"
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=1,
+        help="most rays per pixel of ray traced antialiasing",
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip frames whose png already exists",
+    )
+    args = parser.parse_intermixed_args()
+    if (args.path is None) == (args.turntable is None):
+        parser.error("give either a camera path or --turntable")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    scene = scene_path(args.scene)
+    if args.turntable is not None:
+        meshes = Meshes()
+        if not meshes.load(scene):
+            raise SystemExit(1)
+        keyframes = turntable(meshes, args.turntable, "xyz".index(args.axis))
+    else:
+        keyframes = read_path(Path(args.path))
+    frames = (
+        args.frames if args.frames is not None else keyframes[-1]["frame"] + 1
+    )
+    render_path(
+        scene,
+        keyframes,
+        frames,
+        Path(args.output),
+        view_types.Display(
+            width=np.int64(args.width), height=np.int64(args.height)
+        ),
+        {
+            "mode": args.mode,
+            "projection": args.projection,
+            "samples": args.samples,
+        },
+        max(args.processes, 1),
+        args.resume,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""bounding volume hierarchies for ray queries against Meshes
+
+every tree is a complete binary tree over primitives sorted by the morton
+code of their centroids, stored as flat arrays so it can be built and
+traversed with whole array operations (and shared between processes):
+node i has its children at child[i] and child[i] + 1, leaves have child
+-1 and own the primitives start[i] to start[i] + count[i]
+
+a scene keeps one tree of triangles per mesh, cached by mesh id and only
+rebuilt when the mesh's version changes, and a top level tree over the
+bounds of the meshes. the mesh trees are packed under the leaves of the
+top level into one set of arrays, which rays walk depth first with a
+stack per ray, nearest child first, so boxes behind the closest hit so far
+are skipped"""
+
+from typing import Iterator
+from dataclasses import dataclass, fields
+from mesh.mesh import Meshes, MeshRecord, Vertices
+import numpy as np
+
+# primitives per leaf of a mesh tree
+LEAF_SIZE = 8
+# rays traversed together, bounds the size of the ray stacks
+RAY_CHUNK = 1 << 16
+EPSILON = 1e-9
+# bits per axis of the morton codes
+MORTON_BITS = 10
+
+
+@dataclass
+class BVH:
+    lower: Vertices
+    upper: Vertices
+    # first child of inner nodes, -1 for leaves
+    child: np.ndarray
+    # primitives owned by a leaf, count is 0 for inner nodes
+    start: np.ndarray
+    count: np.ndarray
+    # longest path from the root to a leaf
+    depth: int
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            getattr(self, field.name).nbytes
+            for field in fields(self)
+            if field.name != "depth"
+        )
+
+
+@dataclass
+class Triangles:
+    # (N, 3, 3) first corner and the two edges leaving it of every
+    # triangle, kept together so a lookup gathers one array
+    data: np.ndarray
+
+    @classmethod
+    def from_corners(cls, corners: np.ndarray) -> "Triangles":
+        data = np.empty_like(corners, dtype=np.float64)
+        data[:, 0] = corners[:, 0]
+        data[:, 1] = corners[:, 1] - corners[:, 0]
+        data[:, 2] = corners[:, 2] - corners[:, 0]
+        return cls(data)
+
+    @property
+    def v0(self) -> Vertices:
+        return self.data[:, 0]
+
+    @property
+    def e1(self) -> Vertices:
+        return self.data[:, 1]
+
+    @property
+    def e2(self) -> Vertices:
+        return self.data[:, 2]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def take(self, indices: np.ndarray) -> "Triangles":
+        return Triangles(self.data[indices])
+
+
+def spread_bits(values: np.ndarray) -> np.ndarray:
+    """puts two zero bits between each of the low 10 bits of values"""
+    values = values.astype(np.uint64)
+    values = (values | (values << 16)) & 0x030000FF
+    values = (values | (values << 8)) & 0x0300F00F
+    values = (values | (values << 4)) & 0x030C30C3
+    values = (values | (values << 2)) & 0x09249249
+    return values
+
+
+def morton_codes(points: Vertices) -> np.ndarray:
+    low = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - low, EPSILON)
+    cells = (points - low) / extent * ((1 << MORTON_BITS) - 1)
+    cells = cells.astype(np.uint64)
+    return (
+        (spread_bits(cells[:, 0]) << 2)
+        | (spread_bits(cells[:, 1]) << 1)
+        | spread_bits(cells[:, 2])
+    )
+
+
+def build(
+    lower: Vertices, upper: Vertices, leaf_size: int
+) -> tuple[BVH, np.ndarray]:
+    """tree over primitives with the bounds lower and upper, and the order
+    the primitives have to be in for the leaves' ranges"""
+    primitives = len(lower)
+    leaves = max(1, -(-primitives // leaf_size))
+    # pad to a power of two so every leaf sits on the last level
+    width = 1 << (leaves - 1).bit_length()
+    nodes = 2 * width - 1
+    first_leaf = width - 1
+
+    # padding has nan bounds, which no ray enters
+    node_lower = np.full((nodes, 3), np.nan)
+    node_upper = np.full((nodes, 3), np.nan)
+    child = np.full(nodes, -1, dtype=np.int64)
+    child[:first_leaf] = 2 * np.arange(first_leaf) + 1
+    start = np.zeros(nodes, dtype=np.int64)
+    count = np.zeros(nodes, dtype=np.int64)
+    tree = BVH(
+        node_lower,
+        node_upper,
+        child,
+        start,
+        count,
+        width.bit_length() - 1,
+    )
+    if primitives == 0:
+        return tree, np.empty(0, dtype=np.int64)
+
+    order = np.argsort(morton_codes((lower + upper) / 2), kind="stable")
+    starts = np.arange(leaves) * leaf_size
+    leaf_nodes = slice(first_leaf, first_leaf + leaves)
+    node_lower[leaf_nodes] = np.minimum.reduceat(lower[order], starts)
+    node_upper[leaf_nodes] = np.maximum.reduceat(upper[order], starts)
+    start[leaf_nodes] = starts
+    count[leaf_nodes] = np.minimum(leaf_size, primitives - starts)
+
+    # parents from children, a level at a time from the leaves up, fmin
+    # and fmax ignore padding
+    level_start = first_leaf
+    while level_start > 0:
+        parent_start = (level_start - 1) // 2
+        parents = slice(parent_start, level_start)
+        children = slice(level_start, 2 * level_start + 1)
+        node_lower[parents] = np.fmin(
+            node_lower[children][0::2], node_lower[children][1::2]
+        )
+        node_upper[parents] = np.fmax(
+            node_upper[children][0::2], node_upper[children][1::2]
+        )
+        level_start = parent_start
+    return tree, order
+
+
+def slab(
+    lower: Vertices, upper: Vertices, origins: Vertices, inv_dirs: Vertices
+) -> tuple[np.ndarray, np.ndarray]:
+    """distances along the rays where they enter and leave the boxes"""
+    with np.errstate(invalid="ignore"):
+        t1 = (lower - origins) * inv_dirs
+        t2 = (upper - origins) * inv_dirs
+    entry = np.fmin(t1, t2)
+    exit = np.fmax(t1, t2)
+    # reducing along the short axis by hand is much faster than .reduce
+    near = np.fmax(np.fmax(entry[:, 0], entry[:, 1]), entry[:, 2])
+    far = np.fmin(np.fmin(exit[:, 0], exit[:, 1]), exit[:, 2])
+    return near, far
+
+
+def cross(a: Vertices, b: Vertices) -> Vertices:
+    """row wise cross product without np.cross's per call overhead"""
+    result = np.empty_like(a)
+    result[:, 0] = a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1]
+    result[:, 1] = a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2]
+    result[:, 2] = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    return result
+
+
+def dot(a: Vertices, b: Vertices) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+
+def intersect_pairs(
+    origins: Vertices, directions: Vertices, triangles: Triangles
+) -> np.ndarray:
+    """Möller–Trumbore for rays and triangles paired row by row, distance
+    along the ray or inf for misses"""
+    pvec = cross(directions, triangles.e2)
+    det = dot(triangles.e1, pvec)
+    tvec = origins - triangles.v0
+    qvec = cross(tvec, triangles.e1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv_det = 1 / det
+        u = dot(tvec, pvec) * inv_det
+        v = dot(directions, qvec) * inv_det
+        t = dot(triangles.e2, qvec) * inv_det
+        valid = (
+            (np.abs(det) > EPSILON)
+            & (u >= 0)
+            & (v >= 0)
+            & (u + v <= 1)
+            & (t > EPSILON)
+        )
+    return np.where(valid, t, np.inf)
+
+
+def chunks(count: int, size: int) -> Iterator[slice]:
+    for start in range(0, count, size):
+        yield slice(start, min(start + size, count))
+
+
+def intersect(
+    tree: BVH,
+    triangles: Triangles,
+    origins: Vertices,
+    directions: Vertices,
+) -> tuple[np.ndarray, np.ndarray]:
+    """distance to the nearest hit along every ray (inf for misses) and the
+    index of the triangle hit (-1 for misses)"""
+    depth = np.full(len(directions), np.inf)
+    hit = np.full(len(directions), -1, dtype=np.int64)
+    if len(triangles) == 0:
+        return depth, hit
+    # axis aligned rays would divide by zero in the slab test
+    inv_dirs = 1 / np.where(np.abs(directions) < EPSILON, EPSILON, directions)
+    for chunk in chunks(len(directions), RAY_CHUNK):
+        traverse(
+            tree,
+            triangles,
+            origins[chunk],
+            directions[chunk],
+            inv_dirs[chunk],
+            depth[chunk],
+            hit[chunk],
+        )
+    return depth, hit
+
+
+def traverse(
+    tree: BVH,
+    triangles: Triangles,
+    origins: Vertices,
+    directions: Vertices,
+    inv_dirs: Vertices,
+    depth: np.ndarray,
+    hit: np.ndarray,
+) -> None:
+    """walks every ray down the tree, every step pops one node off each
+    ray's stack, tests the triangles of leaves and pushes the children of
+    inner nodes that the ray enters before its closest hit so far.
+    depth and hit are updated in place"""
+    rays = len(directions)
+    # a step pops one node and pushes at most two
+    stack_nodes = np.empty((rays, tree.depth + 1), dtype=np.int64)
+    stack_near = np.empty((rays, tree.depth + 1))
+    stack_size = np.zeros(rays, dtype=np.int64)
+
+    def push(ray: np.ndarray, node: np.ndarray, near: np.ndarray) -> None:
+        stack_nodes[ray, stack_size[ray]] = node
+        stack_near[ray, stack_size[ray]] = near
+        stack_size[ray] += 1
+
+    near, far = slab(tree.lower[:1], tree.upper[:1], origins, inv_dirs)
+    active = np.flatnonzero((near <= far) & (far >= 0))
+    push(active, np.zeros(len(active), dtype=np.int64), near[active])
+
+    leaf_offsets = np.arange(LEAF_SIZE)
+    while len(active):
+        stack_size[active] -= 1
+        top = stack_size[active]
+        nodes = stack_nodes[active, top]
+        visit = stack_near[active, top] <= depth[active]
+        ray, nodes = active[visit], nodes[visit]
+        leaf = tree.child[nodes] < 0
+
+        # up to LEAF_SIZE (ray, triangle) pairs per ray at a leaf
+        leaf_ray, leaf_node = ray[leaf], nodes[leaf]
+        indices = tree.start[leaf_node][:, None] + leaf_offsets
+        valid = leaf_offsets < tree.count[leaf_node][:, None]
+        indices = np.where(valid, indices, 0)
+        pair_ray = np.repeat(leaf_ray, LEAF_SIZE)
+        t = intersect_pairs(
+            origins[pair_ray],
+            directions[pair_ray],
+            triangles.take(indices.ravel()),
+        ).reshape(-1, LEAF_SIZE)
+        t[~valid] = np.inf
+        nearest = np.argmin(t, axis=1)
+        rows = np.arange(len(leaf_ray))
+        nearest_depth = t[rows, nearest]
+        closer = nearest_depth < depth[leaf_ray]
+        depth[leaf_ray[closer]] = nearest_depth[closer]
+        hit[leaf_ray[closer]] = indices[rows, nearest][closer]
+
+        inner_ray, first = ray[~leaf], tree.child[nodes[~leaf]]
+        origin, inv_dir = origins[inner_ray], inv_dirs[inner_ray]
+        limit = depth[inner_ray]
+        near_a, far_a = slab(
+            tree.lower[first], tree.upper[first], origin, inv_dir
+        )
+        near_b, far_b = slab(
+            tree.lower[first + 1], tree.upper[first + 1], origin, inv_dir
+        )
+        enter_a = (near_a <= far_a) & (far_a >= 0) & (near_a <= limit)
+        enter_b = (near_b <= far_b) & (far_b >= 0) & (near_b <= limit)
+        # the farther child goes on the stack first so the nearer is
+        # popped next
+        a_first = near_a <= near_b
+        for node, near, enter in (
+            (
+                np.where(a_first, first + 1, first),
+                np.where(a_first, near_b, near_a),
+                np.where(a_first, enter_b, enter_a),
+            ),
+            (
+                np.where(a_first, first, first + 1),
+                np.where(a_first, near_a, near_b),
+                np.where(a_first, enter_a, enter_b),
+            ),
+        ):
+            push(inner_ray[enter], node[enter], near[enter])
+
+        active = active[stack_size[active] > 0]
+
+
+def unit_color(color: np.ndarray) -> np.ndarray:
+    """RGB in [0, 1], like vedo colors given in 0-255 are scaled down"""
+    color = np.asarray(color, dtype=np.float64)[:3]
+    return color / 255 if color.max(initial=0) > 1 else color
+
+
+@dataclass
+class MeshBVH:
+    # MeshTable version the tree was built from
+    version: int
+    tree: BVH
+    # in the order of the tree's leaves
+    triangles: Triangles
+    color: np.ndarray
+
+    @classmethod
+    def from_record(cls, record: MeshRecord, version: int) -> "MeshBVH":
+        """fans the faces of record into triangles and builds their tree"""
+        vertices = np.asarray(record.vertices, dtype=np.float64)
+        faces = np.asarray(record.faces, dtype=np.int64)
+        if faces.ndim != 2 or faces.shape[1] < 3:
+            faces = np.empty((0, 3), dtype=np.int64)
+        corners = vertices[
+            np.concatenate(
+                [faces[:, [0, i, i + 1]] for i in range(1, faces.shape[1] - 1)]
+            )
+        ]
+        tree, order = build(
+            corners.min(axis=1), corners.max(axis=1), LEAF_SIZE
+        )
+        return cls(
+            version,
+            tree,
+            Triangles.from_corners(corners[order]),
+            unit_color(record.color),
+        )
+
+    def __len__(self) -> int:
+        return len(self.triangles)
+
+
+class SceneBVH:
+    """trees of the meshes in a scene, kept between frames"""
+
+    meshes: dict[str, MeshBVH]
+    # meshes with triangles in the order of the top level's leaves
+    ids: list[str]
+    # the top level with the mesh trees packed under its leaves
+    tree: BVH
+    triangles: Triangles
+    # index into ids of the mesh every triangle belongs to
+    triangle_mesh: np.ndarray
+    # MeshTable generation the packed tree was built for
+    generation: int | None
+
+    def __init__(self):
+        self.meshes = {}
+        self.generation = None
+        self.pack()
+
+    def update(self, meshes: Meshes) -> list[str]:
+        """rebuilds the trees of meshes that changed since the last update,
+        returns their ids"""
+        table = meshes.meshes
+        if table.generation == self.generation:
+            return []
+        for id in [id for id in self.meshes if id not in table]:
+            del self.meshes[id]
+        rebuilt: list[str] = []
+        for id in table:
+            version = table.version(id)
+            cached = self.meshes.get(id)
+            if cached is None or cached.version != version:
+                self.meshes[id] = MeshBVH.from_record(
+                    table.record(id), version
+                )
+                rebuilt.append(id)
+        self.pack()
+        self.generation = table.generation
+        return rebuilt
+
+    def pack(self) -> None:
+        """builds the top level over the mesh trees and copies them into
+        one set of arrays, every top level leaf is replaced by the root of
+        its mesh's tree (they have the same bounds)"""
+        ids = [id for id, mesh in self.meshes.items() if len(mesh)]
+        top, order = build(
+            np.array([self.meshes[id].tree.lower[0] for id in ids]).reshape(
+                -1, 3
+            ),
+            np.array([self.meshes[id].tree.upper[0] for id in ids]).reshape(
+                -1, 3
+            ),
+            1,
+        )
+        self.ids = [ids[i] for i in order]
+        meshes = [self.meshes[id] for id in self.ids]
+
+        trees: list[BVH] = [top]
+        node_offset = len(top.child)
+        triangle_offset = 0
+        first_leaf = len(top.child) // 2
+        for index, mesh in enumerate(meshes):
+            tree = mesh.tree
+            child = np.where(tree.child >= 0, tree.child + node_offset, -1)
+            start = tree.start + triangle_offset
+            slot = first_leaf + index
+            top.child[slot] = child[0]
+            top.start[slot] = start[0]
+            top.count[slot] = tree.count[0]
+            trees.append(
+                BVH(
+                    tree.lower,
+                    tree.upper,
+                    child,
+                    start,
+                    tree.count,
+                    tree.depth,
+                )
+            )
+            node_offset += len(tree.child)
+            triangle_offset += len(mesh)
+
+        self.tree = BVH(
+            np.concatenate([tree.lower for tree in trees]),
+            np.concatenate([tree.upper for tree in trees]),
+            np.concatenate([tree.child for tree in trees]),
+            np.concatenate([tree.start for tree in trees]),
+            np.concatenate([tree.count for tree in trees]),
+            top.depth + max((mesh.tree.depth for mesh in meshes), default=0),
+        )
+        self.triangles = Triangles(
+            np.concatenate(
+                [np.empty((0, 3, 3))]
+                + [mesh.triangles.data for mesh in meshes]
+            )
+        )
+        self.triangle_mesh = np.repeat(
+            np.arange(len(meshes)), [len(mesh) for mesh in meshes]
+        ).astype(np.int64)
+
+    def intersect(
+        self, origins: Vertices, directions: Vertices
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """distance to the nearest hit along every ray (inf for misses) and
+        the index into self.ids of the mesh hit (-1 for misses)"""
+        depth, triangle = intersect(
+            self.tree, self.triangles, origins, directions
+        )
+        return depth, np.where(
+            triangle >= 0, self.triangle_mesh[np.maximum(triangle, 0)], -1
+        )
+
+    def colors(self) -> np.ndarray:
+        """unit RGB of every mesh in self.ids"""
+        return np.array(
+            [self.meshes[id].color for id in self.ids], dtype=np.float64
+        ).reshape(-1, 3)
@@ -1,77 +1,341 @@
+"""camera parameters and the matrices built from them
+
+a camera keeps each parameter in a read-only array of its own and caches
+its basis, view matrix and the products built on it until a set_* method
+changes the position, focal point or view up. projection matrices only
+depend on their arguments and are kept until the cache fills up"""
+
+from collections.abc import Callable
+from typing import Annotated, Any
+from views import view_types
+from mesh.mesh import Vertex
 import numpy as np
-from mesh.mesh import Meshes, Vertex
+
+Vertices_H = Annotated[np.ndarray[Any, np.dtype[np.float64]], "shape=(4,4)"]
+
+EPSILON = 1e-9
+# vedo's view up for cameras that leave it unset
+VIEWUP = np.array([0, 1, 0], dtype=np.float64)
+VIEWUP.setflags(write=False)
+
+# matrices kept per cache, a cache that fills up starts over
+MATRICES = 16
+
+# parameters in the order state lists them
+PARAMETERS = (
+    "clippping_range",
+    "distance",
+    "focal_point",
+    "parallel_scale",
+    "position",
+    "thickness",
+    "view_angle",
+    "viewup",
+)
+
+Basis = tuple[Vertex, Vertex, Vertex, Vertex]
+
+
+def perspective_matrix(near: np.float64, fov: np.float64) -> Vertices_H:
+    far: np.float64 = np.tan(fov / 2) * near
+
+    # everything is scaled by a factor of z by this matrix
+    return np.array(
+        [
+            [near, 0, 0, 0],
+            [0, near, 0, 0],
+            [
+                0,
+                0,
+                near + far,
+                -1 * near * far,
+            ],
+            [0, 0, 1, 0],
+        ],
+        dtype=np.float64,
+    )
+
+
+def viewport_matrix(display: view_types.Display) -> Vertices_H:
+    # blow up the image to the final size, and shift out of the
+    # center (no negatives)
+    return np.array(
+        [
+            [display.width / 2, 0, 0, (display.width - 1) / 2],
+            [0, display.height / 2, 0, (display.height - 1) / 2],
+            [0, 0, 1, 0],
+            [0, 0, 0, 1],
+        ],
+        dtype=np.float64,
+    )
+
+
+def frozen(value: Any) -> Any:
+    """a read-only float64 copy of value, a float64 for scalars"""
+    array = np.array(value, dtype=np.float64)
+    if array.ndim == 0:
+        return np.float64(array)
+    array.setflags(write=False)
+    return array
 
 
 class Camera:
-    cam: dict = {}
-
-    """- from https://github.com/marcomusy/vedo/blob/master/vedo/plotter.py
-            **pos** (list),  the position of the camera in world coordinates
-            - **focal_point** (list), the focal point of the camera in world coordinates
-            - **viewup** (list), the view up direction for the camera
-            - **distance** (float), set the focal point to the specified distance from the camera position.
-            - **clipping_range** (float), distance of the near and far clipping planes along the direction of projection.
-            - **parallel_scale** (float),
-            scaling used for a parallel projection, i.e. the height of the viewport
-            in world-coordinate distances. The default is 1. Note that the "scale" parameter works as
-            an "inverse scale", larger numbers produce smaller images.
-            This method has no effect in perspective projection mode.
-            - **thickness** (float),
-            set the distance between clipping planes. This method adjusts the far clipping
-            plane to be set a distance 'thickness' beyond the near clipping plane.
-            - **view_angle** (float),
-            the camera view angle, which is the angular height of the camera view
-            measured in degrees. The default angle is 30 degrees.
-            This method has no effect in parallel projection mode.
-            The formula for setting the angle up for perfect perspective viewing is:
-            angle = 2*atan((h/2)/d) where h is the height of the RenderWindow
-            (measured by holding a ruler up to your screen) and d is the distance
-            from your eyes to the screen."""
+    """camera parameters as vedo takes them, descriptions from
+    https://github.com/marcomusy/vedo/blob/master/vedo/plotter.py
+
+    - **pos** (list), the position of the camera in world coordinates
+    - **focal_point** (list), the focal point of the camera in world
+      coordinates
+    - **viewup** (list), the view up direction for the camera
+    - **distance** (float), set the focal point to the specified distance
+      from the camera position.
+    - **clipping_range** (float), distance of the near and far clipping
+      planes along the direction of projection.
+    - **parallel_scale** (float), scaling used for a parallel projection,
+      i.e. the height of the viewport in world-coordinate distances. The
+      default is 1. Note that the "scale" parameter works as an "inverse
+      scale", larger numbers produce smaller images. This method has no
+      effect in perspective projection mode.
+    - **thickness** (float), set the distance between clipping planes.
+      This method adjusts the far clipping plane to be set a distance
+      'thickness' beyond the near clipping plane.
+    - **view_angle** (float), the camera view angle, which is the angular
+      height of the camera view measured in degrees. The default angle is
+      30 degrees. This method has no effect in parallel projection mode.
+      The formula for setting the angle up for perfect perspective viewing
+      is: angle = 2*atan((h/2)/d) where h is the height of the
+      RenderWindow (measured by holding a ruler up to your screen) and d
+      is the distance from your eyes to the screen."""
+
+    __slots__ = (
+        *PARAMETERS,
+        # basis and matrices of the current position, focal point and view
+        # up, emptied when one of them is set
+        "views",
+        # projection matrices by their arguments
+        "projections",
+        # what state returns, None until asked for after a change
+        "key",
+    )
+
+    # None for parameters that were never set
+    position: np.ndarray | None
+    focal_point: np.ndarray | None
+    viewup: np.ndarray | None
+    distance: np.float64 | None
+    parallel_scale: np.float64 | None
+    clippping_range: np.float64 | None
+    thickness: np.float64 | None
+    view_angle: np.float64 | None
+    views: dict[tuple, Any]
+    projections: dict[tuple, Vertices_H]
+    key: tuple | None
+
+    def __init__(self):
+        for name in PARAMETERS:
+            setattr(self, name, None)
+        self.views = {}
+        self.projections = {}
+        self.key = None
+
+    def state(self) -> tuple:
+        """hashable copy of every parameter set, for caching frames"""
+        if self.key is None:
+            self.key = tuple(
+                (name, tuple(np.ravel(value).tolist()))
+                for name in PARAMETERS
+                if (value := getattr(self, name)) is not None
+            )
+        return self.key
+
+    def as_dict(self) -> dict[str, Any]:
+        """the parameters set, in the form vedo's show takes as camera"""
+        return {
+            name: value
+            for name in PARAMETERS
+            if (value := getattr(self, name)) is not None
+        }
+
+    def copy(self) -> "Camera":
+        """a camera with the same parameters, changing either one later
+        leaves the other as it was"""
+        copied = Camera()
+        # parameters and cached matrices are read-only, so they are shared
+        for name in PARAMETERS:
+            setattr(copied, name, getattr(self, name))
+        copied.views = dict(self.views)
+        copied.projections = dict(self.projections)
+        copied.key = self.key
+        return copied
+
+    def set_parameter(self, name: str, value: Any, moves: bool) -> None:
+        """stores a read-only copy of value, moves is whether the
+        parameter changes the basis and view matrix"""
+        setattr(self, name, frozen(value))
+        self.key = None
+        if moves:
+            self.views = {}
+
+    @staticmethod
+    def cached(matrices: dict[tuple, Any], key: tuple, build: Callable):
+        value = matrices.get(key)
+        if value is None:
+            if len(matrices) >= MATRICES:
+                matrices.clear()
+            value = matrices[key] = build()
+        return value
+
+    def basis(self) -> Basis:
+        """camera position and its right, up and forward unit vectors, a
+        focal point that was never set is the origin"""
+        return self.cached(self.views, ("basis",), self.build_basis)
+
+    def build_basis(self) -> Basis:
+        position = self.position
+        if position is None:
+            raise ValueError("the camera has no position")
+        focal_distance = self.focal_distance()
+        if focal_distance < EPSILON:
+            # no direction to look in
+            raise ValueError("the camera is at its focal point")
+        forward = self.gaze() / focal_distance
+
+        viewup = VIEWUP if self.viewup is None else self.viewup
+        right = np.cross(forward, viewup)
+        if np.linalg.norm(right) < EPSILON:
+            # looking along viewup, any perpendicular will do
+            right = np.cross(forward, np.roll(viewup, 1))
+        right /= np.linalg.norm(right)
+        up = np.cross(right, forward)
+        return position, frozen(right), frozen(up), frozen(forward)
+
+    def gaze(self) -> Vertex:
+        """from the position to the focal point"""
+        focal_point = self.focal_point
+        if focal_point is None:
+            focal_point = np.zeros(3, dtype=np.float64)
+        return focal_point - self.position
+
+    def focal_distance(self) -> np.float64:
+        return self.cached(
+            self.views,
+            ("focal distance",),
+            lambda: np.float64(np.linalg.norm(self.gaze())),
+        )
+
+    def view_matrix(self) -> Vertices_H:
+        """world to camera space, the rows of the rotation are right, up
+        and backward (away from the focal point)"""
+        return self.cached(self.views, ("view",), self.build_view_matrix)
+
+    def build_view_matrix(self) -> Vertices_H:
+        position, right, up, forward = self.basis()
+        matrix = np.eye(4, dtype=np.float64)
+        matrix[:3, :3] = right, up, -forward
+        matrix[:3, 3] = -matrix[:3, :3] @ position
+        return frozen(matrix)
+
+    def inverse_view_matrix(self) -> Vertices_H:
+        """camera to world space, its columns are the axes and position of
+        the camera"""
+        return self.cached(
+            self.views, ("inverse view",), self.build_inverse_view_matrix
+        )
+
+    def build_inverse_view_matrix(self) -> Vertices_H:
+        position, right, up, forward = self.basis()
+        matrix = np.eye(4, dtype=np.float64)
+        matrix[:3, :3] = np.transpose([right, up, -forward])
+        matrix[:3, 3] = position
+        return frozen(matrix)
+
+    def projection_matrix(
+        self, near: np.float64, fov: np.float64
+    ) -> Vertices_H:
+        return self.cached(
+            self.projections,
+            ("projection", float(near), float(fov)),
+            lambda: frozen(perspective_matrix(near, fov)),
+        )
+
+    def inverse_projection_matrix(
+        self, near: np.float64, fov: np.float64
+    ) -> Vertices_H:
+        return self.cached(
+            self.projections,
+            ("inverse projection", float(near), float(fov)),
+            lambda: frozen(np.linalg.inv(self.projection_matrix(near, fov))),
+        )
+
+    def mvp_matrix(
+        self, near: np.float64, fov: np.float64, display: view_types.Display
+    ) -> Vertices_H:
+        """viewport (V) * perspective (P) * camera (C), the viewport is
+        linear and keeps w so it can be applied before the divide by w"""
+        return self.cached(
+            self.views,
+            (
+                "mvp",
+                float(near),
+                float(fov),
+                int(display.width),
+                int(display.height),
+            ),
+            lambda: frozen(
+                np.linalg.multi_dot(
+                    [
+                        viewport_matrix(display),
+                        self.projection_matrix(near, fov),
+                        self.view_matrix(),
+                    ]
+                )
+            ),
+        )
 
     def set_position(self, position: Vertex):
-        self.cam["position"] = position
+        self.set_parameter("position", position, moves=True)
 
     def get_position(self) -> Vertex | None:
-        return self.cam.get("position")
+        return self.position
 
     def set_viewup(self, viewup: Vertex):
-        self.cam["viewup"] = viewup
+        self.set_parameter("viewup", viewup, moves=True)
 
     def get_viewup(self) -> Vertex | None:
-        return self.cam.get("viewup")
+        return self.viewup
 
     def set_focal_point(self, focal_point: Vertex):
-        self.cam["focal_point"] = focal_point
+        self.set_parameter("focal_point", focal_point, moves=True)
 
     def get_focal_point(self) -> Vertex | None:
-        return self.cam.get("focal_point")
+        return self.focal_point
 
     def set_distance(self, distance: np.float64):
-        self.cam["distance"] = distance
+        self.set_parameter("distance", distance, moves=False)
 
     def get_distance(self) -> np.float64 | None:
-        return self.cam.get("distance")
+        return self.distance
 
     def set_parallel_scale(self, parallel_scale: np.float64):
-        self.cam["parallel_scale"] = parallel_scale
+        self.set_parameter("parallel_scale", parallel_scale, moves=False)
 
     def get_parallel_scale(self) -> np.float64 | None:
-        return self.cam.get("parallel_scale")
+        return self.parallel_scale
 
     def set_clippping_range(self, clippping_range: np.float64):
-        self.cam["clippping_range"] = clippping_range
+        self.set_parameter("clippping_range", clippping_range, moves=False)
 
     def get_clippping_range(self) -> np.float64 | None:
-        return self.cam.get("clippping_range")
+        return self.clippping_range
 
     def set_thickness(self, thickness: np.float64):
-        self.cam["thickness"] = thickness
+        self.set_parameter("thickness", thickness, moves=False)
 
     def get_thickness(self) -> np.float64 | None:
-        return self.cam.get("thickness")
+        return self.thickness
 
     def set_view_angle(self, view_angle: np.float64):
-        self.cam["view_angle"] = view_angle
+        self.set_parameter("view_angle", view_angle, moves=False)
 
     def get_view_angle(self) -> np.float64 | None:
-        return self.cam.get("view_angle")
+        return self.view_angle
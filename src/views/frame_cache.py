@@ -0,0 +1,62 @@
+"""least recently used cache of rendered frames
+
+frames are keyed by everything that decides what they look like, so a
+view that was already rendered (the same size after a resize event, a
+projection switched back to) is a dictionary lookup. the cache holds at
+most max_bytes of rasters and drops the least recently used beyond that"""
+
+from typing import Hashable
+from collections import OrderedDict
+from views import view_types
+
+# a few dozen full screen frames
+MAX_BYTES = 256 << 20
+
+
+class FrameCache:
+    frames: OrderedDict[Hashable, view_types.Raster]
+    max_bytes: int
+    nbytes: int
+    hits: int
+    misses: int
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.frames = OrderedDict()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def get(self, key: Hashable) -> view_types.Raster | None:
+        raster = self.frames.get(key)
+        if raster is None:
+            self.misses += 1
+            return None
+        self.frames.move_to_end(key)
+        self.hits += 1
+        return raster
+
+    def put(self, key: Hashable, raster: view_types.Raster) -> None:
+        """stores raster read only, it is handed out again on hits. frames
+        larger than the whole cache are not kept"""
+        self.discard(key)
+        if raster.nbytes > self.max_bytes:
+            return
+        raster.flags.writeable = False
+        self.frames[key] = raster
+        self.nbytes += raster.nbytes
+        while self.nbytes > self.max_bytes:
+            _, oldest = self.frames.popitem(last=False)
+            self.nbytes -= oldest.nbytes
+
+    def discard(self, key: Hashable) -> None:
+        raster = self.frames.pop(key, None)
+        if raster is not None:
+            self.nbytes -= raster.nbytes
+
+    def clear(self) -> None:
+        self.frames.clear()
+        self.nbytes = 0
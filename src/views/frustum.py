@@ -0,0 +1,84 @@
+"""view frustums as inward facing planes, for culling meshes by their
+axis aligned bounds before they are projected or drawn
+
+a box is outside when its corner furthest along a plane's normal is still
+behind that plane. boxes near a corner of the frustum can pass every plane
+while outside it, so culling is conservative"""
+
+from dataclasses import dataclass
+from mesh.mesh import Vertex, Vertices
+import numpy as np
+
+
+@dataclass
+class Frustum:
+    # (P, 3) normals pointing inside and (P,) offsets, a point x is inside
+    # when normals @ x + offsets >= 0 for every plane
+    normals: Vertices
+    offsets: np.ndarray
+
+    @classmethod
+    def through(cls, eye: Vertex, normals: list[Vertex]) -> "Frustum":
+        """planes through eye"""
+        stacked = np.array(normals, dtype=np.float64)
+        return cls(stacked, -(stacked @ eye))
+
+    def with_near(
+        self, eye: Vertex, forward: Vertex, near: float
+    ) -> "Frustum":
+        """adds the plane near in front of eye"""
+        return Frustum(
+            np.vstack([self.normals, forward]),
+            np.append(self.offsets, -(forward @ eye) - near),
+        )
+
+    def contains(self, lower: Vertices, upper: Vertices) -> np.ndarray:
+        """whether each of the (M, 3) boxes from lower to upper can be
+        inside"""
+        furthest = np.where(
+            self.normals[None, :, :] >= 0,
+            upper[:, None, :],
+            lower[:, None, :],
+        )
+        distance = np.einsum("mpk,pk->mp", furthest, self.normals)
+        return (distance + self.offsets >= 0).all(axis=1)
+
+
+def perspective(
+    eye: Vertex,
+    right: Vertex,
+    up: Vertex,
+    forward: Vertex,
+    half_width: float,
+    half_height: float,
+    near: float = 0.0,
+) -> Frustum:
+    """what a camera at eye sees, half_width and half_height are the
+    extents of its image plane at distance 1"""
+    return Frustum.through(
+        eye,
+        [
+            half_width * forward + right,
+            half_width * forward - right,
+            half_height * forward + up,
+            half_height * forward - up,
+        ],
+    ).with_near(eye, forward, near)
+
+
+def orthographic(
+    eye: Vertex,
+    right: Vertex,
+    up: Vertex,
+    forward: Vertex,
+    half_width: float,
+    half_height: float,
+    near: float = 0.0,
+) -> Frustum:
+    """what a parallel projection from eye sees, half_width and
+    half_height are the extents of the view in world units"""
+    normals = np.array([right, -right, up, -up], dtype=np.float64)
+    extents = np.array([half_width, half_width, half_height, half_height])
+    return Frustum(normals, extents - normals @ eye).with_near(
+        eye, forward, near
+    )
@@ -0,0 +1,84 @@
+"""(height, width, 3) uint8 rasters reused between frames
+
+renderers write frames into rasters lent by the pool instead of
+allocating new ones. a raster is a view of a buffer the pool keeps, the
+buffer is lent again once that view is gone: the frame cache, the window
+showing it or a memoryview of its data keep it in use, so a frame never
+changes under whoever holds it. views taken of a raster (raster[::-1])
+refer to the buffer and not to the raster, holders have to keep the
+raster itself"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from weakref import ref
+from views import view_types
+import numpy as np
+
+# free buffers kept per size
+SPARE = 2
+# sizes free buffers are kept for, the most recently asked for
+SIZES = 3
+
+
+@dataclass
+class Slot:
+    buffer: view_types.Raster
+    # the raster last lent out of buffer
+    lent: ref | None = None
+
+    def is_free(self) -> bool:
+        return self.lent is None or self.lent() is None
+
+
+class RasterPool:
+    # (height, width) -> buffers of that size, the least recently asked
+    # for size first
+    slots: OrderedDict[tuple[int, int], list[Slot]]
+    # buffers allocated so far
+    allocations: int
+
+    def __init__(self):
+        self.slots = OrderedDict()
+        self.allocations = 0
+
+    def acquire(self, display: view_types.Display) -> view_types.Raster:
+        """a raster of display's size, its contents are left over from
+        earlier frames"""
+        size = (int(display.height), int(display.width))
+        slots = self.slots.setdefault(size, [])
+        self.slots.move_to_end(size)
+        slot = next((slot for slot in slots if slot.is_free()), None)
+        if slot is None:
+            slot = Slot(np.empty((*size, 3), dtype=np.uint8))
+            slots.append(slot)
+            self.allocations += 1
+        raster = slot.buffer.view()
+        slot.lent = ref(raster)
+        self.trim()
+        return raster
+
+    def trim(self) -> None:
+        """drops free buffers beyond SPARE per size and every free buffer
+        of sizes not among the SIZES last asked for"""
+        recent = list(self.slots)[-SIZES:]
+        for size in list(self.slots):
+            spare = SPARE if size in recent else 0
+            kept: list[Slot] = []
+            for slot in self.slots[size]:
+                if not slot.is_free():
+                    kept.append(slot)
+                elif spare > 0:
+                    kept.append(slot)
+                    spare -= 1
+            if kept:
+                self.slots[size] = kept
+            else:
+                del self.slots[size]
+
+    def nbytes(self) -> int:
+        """bytes of every buffer kept, lent or free"""
+        return sum(
+            slot.buffer.nbytes
+            for slots in self.slots.values()
+            for slot in slots
+        )
@@ -1,167 +1,468 @@
 from typing import Annotated, Any
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
+from itertools import count
 from views import view_types, camera
-from mesh.mesh import Meshes, copy_mesh, Vertex
+from views.camera import Vertices_H
+from views.bvh import unit_color
+from mesh.mesh import Meshes, Vertices, build_mesh
+from mesh import lod, scene_file
+from vtkmodules.util.numpy_support import numpy_to_vtk
 import vedo
 import numpy as np
 
 Vertex_H = Annotated[np.ndarray[Any, np.dtype[np.float64]], "shape=(4)"]
-Vertices_H = Annotated[np.ndarray[Any, np.dtype[np.float64]], "shape=(4,4)"]
-
-
-def normalize(vertex: Vertex) -> Vertex:
-    return vertex / np.sqrt(np.dot(vertex, vertex))
-
-
-def cam_transform(
-    vertex: Vertex_H, eye: Vertex, gaze: Vertex, up: Vertex
-) -> Vertex_H:
-    # point away from objects
-    w = -1 * normalize(gaze)
-    # point right
-    u = normalize(np.cross(up, w))  # type: ignore
-    # point up
-    v = np.cross(w, u)
-    translation: Vertices_H = np.array(
-        [
-            [1, 0, 0, -1 * eye[0]],
-            [0, 1, 0, -1 * eye[1]],
-            [0, 0, 1, -1 * eye[2]],
-            [0, 0, 0, 1],
-        ],
-        dtype=np.float64,
-    )
 
-    # shape 4 x 4
-    basis_change: Vertices_H = np.array(
-        [
-            [u[0], v[0], w[0], 0],
-            [u[1], v[1], w[1], 0],
-            [u[2], v[2], w[2], 0],
-            [0, 0, 0, 1],
-        ],
-        dtype=np.float64,
-    )
+# meshes with at most this many faces are merged into batches by color
+BATCH_MESH_FACES = 4096
+# triangles in one batch, a changed member only rebuilds its own batch
+BATCH_TRIANGLES = 1 << 16
 
-    # returning basis_change (B) * translation (T) * homogenous_coords_rows (H)
-    #   (B * T * Ht)t
-    #   = H * (B * T)t
-    transformation = np.transpose(np.dot(basis_change, translation))
-    return np.dot(vertex, transformation)
-
-
-def project_perspective(
-    vertex: Vertex_H,
-    near: np.float64,
-    fov: np.float64,
-) -> Vertex_H:
-    far: np.float64 = np.tan(fov / 2) * near
-
-    # everything is scaled by a factor of z by this matrix
-    transform: Vertices_H = np.array(
-        [
-            [near, 0, 0, 0],
-            [0, near, 0, 0],
-            [
-                0,
-                0,
-                near + far,
-                -1 * near * far,
-            ],
-            [0, 0, 1, 0],
-        ],
-        dtype=np.float64,
-    )
 
-    # need to scale the output vectors based on their z coordinate
-    # not a linear transformation but only way to solve problem
-    scaled_result: Vertices_H = np.dot(vertex, np.transpose(transform))
-    for i in range(len(scaled_result)):
-        scaled_result[i] = scaled_result[i] / scaled_result[i, -1]
-    return scaled_result
-
-
-# Viewport Transformation
-def viewport_transform(
-    vertex: Vertex_H, display: view_types.Display
-) -> Vertex_H:
-
-    # blow up the image to the final size, and shift out of the
-    # center (no negatives)
-    viewport_matrix: Vertex_H = np.array(
-        [
-            [display.width / 2, 0, 0, (display.width - 1) / 2],
-            [0, display.height / 2, 0, (display.height - 1) / 2],
-            [0, 0, 1, 0],
-            [0, 0, 0, 1],
-        ],
-        dtype=np.float64,
+def transform_vertices(
+    vertices: Vertices,
+    transform: Vertices_H,
+    out: Vertices | None = None,
+    homo_coords: Vertex_H | None = None,
+) -> Vertices:
+    """applies a 4 x 4 projective transform to rows of xyz without building
+    homogenous coordinates, returns rows of xyz after the divide by w
+
+    out (N x 3) and homo_coords (N x 4) can be passed in to reuse buffers"""
+    homo_coords = np.dot(
+        vertices, np.transpose(transform[:, :3]), out=homo_coords
     )
+    homo_coords += transform[:, 3]
+    return np.divide(homo_coords[:, :3], homo_coords[:, 3:], out=out)
 
-    homo_coords = np.transpose(np.dot(viewport_matrix, np.transpose(vertex)))
 
-    homo_coords = np.dot(vertex, np.transpose(viewport_matrix))
-    return homo_coords
+class RenderContext:
+    """long lived offscreen render window, keeps one actor per mesh id so
+    each frame only has to update the camera and draw"""
 
+    plotter: vedo.Plotter | None
+    actors: dict[str, vedo.Mesh]
+    # bottom up pixels read back from the window, kept between frames of
+    # the same size, and the VTK array reading into them
+    pixels: np.ndarray
+    pixel_array: Any
 
-def project_mesh(
-    vertex: Vertex,
-    eye: Vertex,
-    gaze: Vertex,
-    up: Vertex,
-    near: np.float64,
-    fov: np.float64,
-    display: view_types.Display,
-) -> Vertex:
-    homo_coords = np.concatenate(
-        (vertex, np.ones((vertex.shape[0], 1), dtype=np.float64)), axis=1
+    def __init__(self):
+        self.plotter = None
+        self.actors = {}
+        self.pixels = np.empty((0, 0, 3), dtype=np.uint8)
+        self.pixel_array = vedo.vtkclasses.vtkUnsignedCharArray()
+
+    def get_plotter(self) -> vedo.Plotter:
+        if self.plotter is None:
+            self.plotter = vedo.Plotter(offscreen=True)
+        return self.plotter
+
+    def sync(
+        self,
+        meshes: MutableMapping[str, vedo.Mesh],
+        visible: set[str] | None = None,
+    ) -> None:
+        """add actors for new mesh ids, swap actors for meshes that were
+        replaced and drop actors for ids that are gone. actors not in
+        visible (when given) stay in the scene but are hidden"""
+        plotter = self.get_plotter()
+        for id in [id for id in self.actors if id not in meshes]:
+            plotter.remove(self.actors.pop(id))
+        for id in meshes:
+            actor = self.actors.get(id)
+            if actor is not meshes[id]:
+                if actor is not None:
+                    plotter.remove(actor)
+                plotter.add(meshes[id])
+                self.actors[id] = meshes[id]
+            if visible is None or id in visible:
+                self.actors[id].on()
+            else:
+                self.actors[id].off()
+
+    def draw(
+        self,
+        display: view_types.Display,
+        cam: dict | None = None,
+        out: view_types.Raster | None = None,
+    ) -> view_types.Raster:
+        """draws the scene and reads it into out (a new raster when None)"""
+        plotter = self.get_plotter()
+        size = [int(display.width), int(display.height)]
+        if cam is None:
+            plotter.show(size=size, resetcam=True)
+        else:
+            plotter.show(size=size, camera=cam)
+        if out is None:
+            out = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        return self.read_pixels(out)
+
+    def read_pixels(self, out: view_types.Raster) -> view_types.Raster:
+        """copies the window's back buffer into out top row first, reading
+        straight from this context's window rather than vedo's current
+        plotter"""
+        height, width = out.shape[:2]
+        if self.pixels.shape != out.shape:
+            self.pixels = np.empty(out.shape, dtype=np.uint8)
+            self.pixel_array.SetNumberOfComponents(3)
+            # VTK writes into self.pixels and never frees it
+            self.pixel_array.SetVoidArray(self.pixels, self.pixels.size, 1)
+        assert self.plotter is not None
+        self.plotter.window.GetPixelData(
+            0, 0, width - 1, height - 1, 0, self.pixel_array, 0
+        )
+        np.copyto(out, self.pixels[::-1])
+        return out
+
+    def close(self) -> None:
+        if self.plotter is not None:
+            self.plotter.close()
+        self.plotter = None
+        self.actors.clear()
+
+
+class ProjectionBuffers:
+    """projected stand-ins for the meshes in a scene
+
+    each proxy shares its face connectivity with the source mesh and its
+    points are a view into one projected vertex buffer for the whole scene,
+    so frames only write new coordinates in place and nothing is copied
+    besides the vertices themselves"""
+
+    sources: dict[str, vedo.Mesh]
+    proxies: dict[str, vedo.Mesh]
+    slices: dict[str, slice]
+    # MTime of each source's properties when they were last copied onto
+    # its proxy
+    property_times: dict[str, int]
+
+    # rows of every source mesh, the projection scratch space and the
+    # projected rows the proxies point at, all sized to the scene
+    source_vertices: Vertices
+    homo_coords: Vertex_H
+    projected_vertices: Vertices
+
+    def __init__(self):
+        self.sources = {}
+        self.proxies = {}
+        self.slices = {}
+        self.property_times = {}
+        self.allocate(0)
+
+    def allocate(self, rows: int) -> None:
+        self.source_vertices = np.empty((rows, 3), dtype=np.float64)
+        self.homo_coords = np.empty((rows, 4), dtype=np.float64)
+        self.projected_vertices = np.empty((rows, 3), dtype=np.float64)
+
+    def make_proxy(self, mesh: vedo.Mesh, rows: slice) -> vedo.Mesh:
+        points = vedo.vtkclasses.vtkPoints()
+        # deep=False keeps VTK pointing at our buffer
+        points.SetData(numpy_to_vtk(self.projected_vertices[rows], deep=False))
+        polydata = vedo.vtkclasses.vtkPolyData()
+        polydata.SetPoints(points)
+        polydata.SetPolys(mesh.dataset.GetPolys())
+        return vedo.Mesh(polydata)
+
+    def copy_properties(self, id: str) -> None:
+        """copies the color and other properties of the source mesh onto
+        its proxy when they changed since the last copy"""
+        properties = self.sources[id].properties
+        if self.property_times.get(id) != properties.GetMTime():
+            self.proxies[id].properties.DeepCopy(properties)
+            self.property_times[id] = properties.GetMTime()
+
+    def sync(self, meshes: dict[str, vedo.Mesh]) -> None:
+        """rebuilds the buffers only when meshes were added, removed,
+        replaced or changed their number of vertices"""
+        unchanged = self.sources.keys() == meshes.keys() and all(
+            self.sources[id] is meshes[id]
+            and self.slices[id].stop - self.slices[id].start
+            == meshes[id].npoints
+            for id in meshes
+        )
+        if unchanged:
+            return
+
+        self.slices.clear()
+        rows = 0
+        for id in meshes:
+            self.slices[id] = slice(rows, rows + meshes[id].npoints)
+            rows += meshes[id].npoints
+        self.allocate(rows)
+        self.sources = dict(meshes)
+        self.proxies = {
+            id: self.make_proxy(meshes[id], self.slices[id]) for id in meshes
+        }
+        self.property_times.clear()
+
+    def project(
+        self,
+        meshes: dict[str, vedo.Mesh],
+        transform: Vertices_H,
+        visible: set[str] | None = None,
+    ) -> dict[str, vedo.Mesh]:
+        """projects the meshes in visible (all when None) into their
+        proxies, the rows of the others are left as they were"""
+        self.sync(meshes)
+        ids = (
+            list(meshes)
+            if visible is None
+            else [id for id in meshes if id in visible]
+        )
+        for id in ids:
+            self.source_vertices[self.slices[id]] = meshes[id].vertices
+        if len(ids) == len(meshes):
+            transform_vertices(
+                self.source_vertices,
+                transform,
+                out=self.projected_vertices,
+                homo_coords=self.homo_coords,
+            )
+        else:
+            for id in ids:
+                rows = self.slices[id]
+                transform_vertices(
+                    self.source_vertices[rows],
+                    transform,
+                    out=self.projected_vertices[rows],
+                    homo_coords=self.homo_coords[rows],
+                )
+        for id in ids:
+            self.proxies[id].dataset.GetPoints().Modified()
+            self.copy_properties(id)
+        return self.proxies
+
+
+@dataclass
+class Member:
+    # MeshTable version the arrays were read at
+    version: int
+    vertices: Vertices
+    triangles: lod.Triangles
+
+
+@dataclass
+class Batch:
+    color: tuple[int, int, int]
+    # the meshes merged into it, kept so a rebuild reads no mesh again
+    members: dict[str, Member] = field(default_factory=dict)
+    triangles: int = 0
+    # None until built and again whenever members change
+    mesh: vedo.Mesh | None = None
+
+
+class SceneBatches:
+    """small meshes merged into a few vedo.Meshes per color, so drawing
+    many of them costs a few actors instead of one each
+
+    members keep their batch until they change or go away, then only the
+    batches they left or joined are rebuilt. larger meshes and meshes
+    whose faces mix polygon sizes are drawn on their own, at their level
+    of detail"""
+
+    generation: int | None
+    batches: dict[str, Batch]
+    # batch key of every merged mesh and ids of the meshes drawn alone
+    member_batch: dict[str, str]
+    singles: list[str]
+    # batch of every color that still has room
+    open_batches: dict[tuple[int, int, int], str]
+    keys: count
+
+    def __init__(self):
+        self.generation = None
+        self.batches = {}
+        self.member_batch = {}
+        self.singles = []
+        self.open_batches = {}
+        self.keys = count()
+
+    def leave(self, id: str) -> None:
+        batch = self.batches[self.member_batch.pop(id)]
+        batch.triangles -= len(batch.members.pop(id).triangles)
+        batch.mesh = None
+
+    def join(self, id: str, member: Member, color: tuple) -> None:
+        triangles = len(member.triangles)
+        key = self.open_batches.get(color)
+        fits = key is not None and (
+            self.batches[key].triangles + triangles <= BATCH_TRIANGLES
+        )
+        if not fits:
+            # mesh ids have no spaces, batch keys never collide with them
+            key = f"batch {next(self.keys)}"
+            self.batches[key] = Batch(color)
+            self.open_batches[color] = key
+        batch = self.batches[key]
+        batch.members[id] = member
+        batch.triangles += triangles
+        batch.mesh = None
+        self.member_batch[id] = key
+
+    def sync(self, meshes: Meshes) -> None:
+        table = meshes.meshes
+        if table.generation == self.generation:
+            return
+        for id, key in list(self.member_batch.items()):
+            if id not in table or (
+                table.version(id) != self.batches[key].members[id].version
+            ):
+                self.leave(id)
+
+        self.singles = []
+        for id in table:
+            if id in self.member_batch:
+                continue
+            if table.is_ragged(id):
+                # drawn with its own polygons rather than merged triangles
+                self.singles.append(id)
+                continue
+            record = table.record(id)
+            if len(record.faces) > BATCH_MESH_FACES:
+                self.singles.append(id)
+                continue
+            color = np.round(
+                np.clip(unit_color(record.color), 0, 1) * 255
+            ).astype(int)
+            member = Member(
+                table.version(id),
+                scene_file.unmapped(record.vertices),
+                lod.triangulate(record.faces),
+            )
+            self.join(id, member, tuple(color.tolist()))
+
+        for key in [
+            key for key, batch in self.batches.items() if not batch.members
+        ]:
+            del self.batches[key]
+        self.open_batches = {
+            color: key
+            for color, key in self.open_batches.items()
+            if key in self.batches
+        }
+        for batch in self.batches.values():
+            if batch.mesh is None:
+                batch.mesh = merge(batch)
+        self.generation = table.generation
+
+    def drawables(
+        self,
+        meshes: Meshes,
+        visible: set[str] | None,
+        levels: dict[str, int] | None,
+    ) -> tuple[dict[str, vedo.Mesh], set[str] | None]:
+        """what to draw in place of meshes, and which of it is visible. a
+        batch is drawn when any of its members is visible"""
+        self.sync(meshes)
+        levels = levels or {}
+        scene = {
+            id: meshes.meshes.level_mesh(id, levels.get(id, 0))
+            for id in self.singles
+        }
+        for key, batch in self.batches.items():
+            assert batch.mesh is not None
+            scene[key] = batch.mesh
+        if visible is None:
+            return scene, None
+        shown = {id for id in self.singles if id in visible}
+        shown.update(
+            key
+            for key, batch in self.batches.items()
+            if any(id in visible for id in batch.members)
+        )
+        return scene, shown
+
+
+def merge(batch: Batch) -> vedo.Mesh:
+    """one vedo.Mesh of every member of batch"""
+    members = list(batch.members.values())
+    offsets = np.cumsum([0] + [len(member.vertices) for member in members])
+    return build_mesh(
+        np.concatenate([member.vertices for member in members]),
+        np.concatenate(
+            [
+                member.triangles + offset
+                for member, offset in zip(members, offsets)
+            ]
+        ),
+        np.array(batch.color, dtype=np.float64) / 255,
     )
-    homo_coords = cam_transform(homo_coords, eye, gaze, up)
-    homo_coords = project_perspective(homo_coords, near, fov)
-    homo_coords = viewport_transform(homo_coords, display)
-    return np.delete(homo_coords, -1, 1)
+
+
+def detail_meshes(
+    meshes: Meshes, levels: dict[str, int] | None
+) -> MutableMapping[str, vedo.Mesh]:
+    """the vedo.Mesh drawn for every id, at its level of detail in levels
+    (the full mesh for ids not in it)"""
+    if not levels:
+        return meshes.meshes
+    return {
+        id: meshes.meshes.level_mesh(id, levels.get(id, 0))
+        for id in meshes.meshes
+    }
+
+
+def scene_meshes(
+    meshes: Meshes,
+    visible: set[str] | None,
+    levels: dict[str, int] | None,
+    batches: SceneBatches | None,
+) -> tuple[MutableMapping[str, vedo.Mesh], set[str] | None]:
+    """the vedo.Meshes to draw and which of them are visible, merged by
+    batches when given"""
+    if batches is None:
+        return detail_meshes(meshes, levels), visible
+    return batches.drawables(meshes, visible, levels)
 
 
 def render_orth(
     display: view_types.Display,
     meshes: Meshes,
     cam: camera.Camera,
+    context: RenderContext | None = None,
+    visible: set[str] | None = None,
+    levels: dict[str, int] | None = None,
+    batches: SceneBatches | None = None,
+    out: view_types.Raster | None = None,
 ) -> view_types.Raster:
-    plotter = vedo.Plotter(offscreen=True)
-    for key in meshes.meshes:
-        plotter.add(meshes.meshes[key])
-
-    plotter.show(size=[display.width, display.height], camera=cam.cam)
-    return np.array(plotter.screenshot(asarray=True), dtype=np.uint8)
+    """meshes not in visible (when given) are not drawn, levels picks the
+    level of detail drawn of the meshes in it and batches (when given)
+    merges the small ones by color. the frame is written into out when
+    given"""
+    if context is None:
+        context = RenderContext()
+    context.sync(*scene_meshes(meshes, visible, levels, batches))
+    return context.draw(display, cam.as_dict(), out)
 
 
 def render_pers(
     display: view_types.Display,
     meshes: Meshes,
     cam: camera.Camera,
+    context: RenderContext | None = None,
+    buffers: ProjectionBuffers | None = None,
+    visible: set[str] | None = None,
+    levels: dict[str, int] | None = None,
+    batches: SceneBatches | None = None,
+    out: view_types.Raster | None = None,
 ) -> view_types.Raster:
+    """meshes not in visible (when given) are neither projected nor
+    drawn, levels picks the level of detail drawn of the meshes in it and
+    batches (when given) merges the small ones by color. the frame is
+    written into out when given"""
     cam_position = cam.get_position()
     cam_focal = cam.get_focal_point()
     if cam_position is None or cam_focal is None:
-        return render_orth(display, meshes, cam)
-
-    cam_gaze = cam_focal - cam_position
-    # TODO: get a dynamic up direction
-    cam_up = np.array([0, 1, 0], dtype=np.float64)
-    new_meshes = copy_mesh(meshes)
-    for key in new_meshes.meshes:
-        new_meshes.meshes[key].vertices = project_mesh(
-            new_meshes.meshes[key].vertices,
-            cam_position,
-            cam_gaze,
-            cam_up,
-            np.float64(1),
-            np.float64(np.pi / 2),
-            display,
+        return render_orth(
+            display, meshes, cam, context, visible, levels, batches, out
         )
 
-    plotter = vedo.Plotter(offscreen=True)
-    for key in new_meshes.meshes:
-        plotter.add(new_meshes.meshes[key])
-
-    plotter.show(size=[display.width, display.height])
-    return np.array(plotter.screenshot(asarray=True), dtype=np.uint8)
+    transform = cam.mvp_matrix(np.float64(1), np.float64(np.pi / 2), display)
+    if buffers is None:
+        buffers = ProjectionBuffers()
+    if context is None:
+        context = RenderContext()
+    scene, shown = scene_meshes(meshes, visible, levels, batches)
+    context.sync(buffers.project(scene, transform, shown), shown)
+    return context.draw(display, out=out)
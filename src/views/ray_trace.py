@@ -1,11 +1,716 @@
-from views import view_types, camera
-from mesh.mesh import Meshes
+"""ray traced rendering in numpy
+
+one primary ray per pixel from the camera position, intersected against
+the triangles of the scene through the trees in bvh
+
+with a TracePool the image is split into tiles that are traced on a pool of
+processes kept alive between frames. the packed trees and triangles are
+published once per scene change in a read only shared memory block that
+the workers map, and the workers write their tiles straight into a shared
+frame of color, depth and mesh id. tasks only carry block names, the view
+and a tile rectangle
+
+progressive traces a frame in passes, every 8th pixel of every 8th row
+first and then the pixels in between, with an upscaled preview after
+every pass. the passes together trace every pixel once
+
+with samples above 1 the finished frame is antialiased adaptively, pixels
+that differ from a neighbour in color or sit on a mesh or depth edge get
+up to samples - 1 more rays at points spread over the pixel, the most
+different first until the frame's ray budget is spent"""
+
+from typing import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from views import view_types, camera, bvh
+from views.raster_pool import RasterPool
+from mesh.mesh import Meshes, Vertex, Vertices
+from mesh import scene_file
+from mesh.parallel_load import attach, write_array
+import atexit
+import os
 import numpy as np
 
+EPSILON = 1e-9
+
+# vedo's default for cameras that leave it unset
+VIEW_ANGLE = 30.0
+
+BACKGROUND = np.array([255, 255, 255], dtype=np.uint8)
+# brightness of the farthest point of the scene, the nearest is fully lit
+MIN_SHADE = 0.2
+
+# edge length in pixels of the square tiles handed to workers
+TILE_SIZE = 64
+
+# pixel strides of the progressive passes
+PASSES = (8, 4, 2, 1)
+# pixels traced between yields when tracing on the calling thread
+STEP_PIXELS = 1 << 14
+# seconds waited for workers between yields
+POLL_INTERVAL = 0.01
+
+# pixels closer than this to all neighbours in every channel, as a share
+# of 255, are not antialiased
+CONTRAST = 0.03
+# neighbours whose distances differ by more than this share of the nearer
+# one are on different surfaces
+DEPTH_EDGE = 0.1
+# plastic number, spreads the subpixel samples of the R2 sequence
+PLASTIC = 1.32471795724474602596
+
+# name -> (offset in block, shape, dtype) of arrays in a shared block
+Layout = dict[str, tuple[int, tuple[int, ...], str]]
+
+
+@dataclass
+class View:
+    """everything needed to make the primary rays of any pixel"""
+
+    position: Vertex
+    right: Vertex
+    up: Vertex
+    forward: Vertex
+    # half the extent of the image plane at distance 1
+    half_width: float
+    half_height: float
+    width: int
+    height: int
+
+
+def camera_view(display: view_types.Display, cam: camera.Camera) -> View:
+    width, height = int(display.width), int(display.height)
+    view_angle = cam.get_view_angle()
+    if view_angle is None:
+        view_angle = VIEW_ANGLE
+    # view angle is the vertical field of view
+    half_height = float(np.tan(np.deg2rad(view_angle) / 2))
+    return View(
+        *cam.basis(),
+        half_width=half_height * width / height,
+        half_height=half_height,
+        width=width,
+        height=height,
+    )
+
+
+def pixel_rays(view: View, ys: np.ndarray, xs: np.ndarray) -> Vertices:
+    """unit directions through the image points (ys, xs), in pixels from
+    the top left corner of the image"""
+    across = (xs / view.width * 2 - 1) * view.half_width
+    down = (1 - ys / view.height * 2) * view.half_height
+    directions = np.empty((len(ys), 3), dtype=np.float64)
+    directions[...] = view.forward
+    directions += across[:, None] * view.right
+    directions += down[:, None] * view.up
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return directions
+
+
+def pixel_grid(
+    rows: slice, cols: slice, stride: int = 1, skip: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """row major (ys, xs) of every stride-th pixel in rows x cols, leaving
+    out the pixels on the coarser grid skip that an earlier pass traced.
+    rows and cols start on multiples of stride"""
+    ys, xs = np.meshgrid(
+        np.arange(rows.start, rows.stop, stride),
+        np.arange(cols.start, cols.stop, stride),
+        indexing="ij",
+    )
+    ys, xs = ys.ravel(), xs.ravel()
+    if skip:
+        keep = (ys % skip != 0) | (xs % skip != 0)
+        ys, xs = ys[keep], xs[keep]
+    return ys, xs
+
+
+def primary_rays(
+    display: view_types.Display, cam: camera.Camera
+) -> tuple[Vertex, Vertices]:
+    """the camera position and a unit direction through the center of
+    every pixel, row major from the top left"""
+    view = camera_view(display, cam)
+    ys, xs = pixel_grid(slice(0, view.height), slice(0, view.width))
+    return view.position, pixel_rays(view, ys + 0.5, xs + 0.5)
+
+
+def depth_range(tree: bvh.BVH, position: Vertex) -> tuple[float, float]:
+    """distances from position to the nearest and farthest points of the
+    scene's bounds, the same for every tile of a frame"""
+    lower, upper = tree.lower[0], tree.upper[0]
+    if np.isnan(lower).any():
+        return 0.0, 1.0
+    nearest = np.clip(position, lower, upper)
+    farthest = np.where(position < (lower + upper) / 2, upper, lower)
+    return (
+        float(np.linalg.norm(nearest - position)),
+        float(np.linalg.norm(farthest - position)),
+    )
+
+
+def shade(
+    depth: np.ndarray,
+    hit: np.ndarray,
+    colors: Vertices,
+    near: float,
+    far: float,
+) -> np.ndarray:
+    """mesh color darkened with distance from near to far. hit indexes
+    colors, returns uint8 RGB per ray"""
+    pixels = np.empty((len(depth), 3), dtype=np.uint8)
+    pixels[...] = BACKGROUND
+    hits = hit >= 0
+    if not hits.any():
+        return pixels
+    closeness = 1 - (depth[hits] - near) / max(far - near, EPSILON)
+    brightness = MIN_SHADE + (1 - MIN_SHADE) * np.clip(closeness, 0, 1)
+    pixels[hits] = np.clip(
+        colors[hit[hits]] * brightness[:, None] * 255, 0, 255
+    ).astype(np.uint8)
+    return pixels
+
+
+@dataclass
+class SceneArrays:
+    """what tracing needs of a SceneBVH, in this process or mapped from a
+    shared block"""
+
+    tree: bvh.BVH
+    triangles: bvh.Triangles
+    # index into colors of the mesh every triangle belongs to
+    triangle_mesh: np.ndarray
+    colors: Vertices
+
+    @classmethod
+    def from_scene(cls, scene: bvh.SceneBVH) -> "SceneArrays":
+        return cls(
+            scene.tree, scene.triangles, scene.triangle_mesh, scene.colors()
+        )
+
+    @classmethod
+    def from_shared(cls, arrays: dict[str, np.ndarray]) -> "SceneArrays":
+        return cls(
+            bvh.BVH(
+                arrays["lower"],
+                arrays["upper"],
+                arrays["child"],
+                arrays["start"],
+                arrays["count"],
+                int(arrays["depth"][0]),
+            ),
+            bvh.Triangles(arrays["triangles"]),
+            arrays["triangle_mesh"],
+            arrays["colors"],
+        )
+
+    def shared(self) -> dict[str, np.ndarray]:
+        """the arrays to publish for from_shared"""
+        return {
+            "lower": self.tree.lower,
+            "upper": self.tree.upper,
+            "child": self.tree.child,
+            "start": self.tree.start,
+            "count": self.tree.count,
+            "depth": np.array([self.tree.depth], dtype=np.int64),
+            "triangles": self.triangles.data,
+            "triangle_mesh": self.triangle_mesh,
+            "colors": self.colors,
+        }
+
+
+def frame_buffers(view: View) -> dict[str, np.ndarray]:
+    """color, distance and mesh id of every pixel"""
+    shape = (view.height, view.width)
+    return {
+        "color": np.zeros((*shape, 3), dtype=np.uint8),
+        "depth": np.zeros(shape, dtype=np.float64),
+        "hit": np.zeros(shape, dtype=np.int64),
+    }
+
+
+def sample_rays(
+    scene: SceneArrays,
+    view: View,
+    depth_bounds: tuple[float, float],
+    ys: np.ndarray,
+    xs: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """color, distance and mesh id (-1 for misses) seen through the image
+    points (ys, xs)"""
+    directions = pixel_rays(view, ys, xs)
+    depth, triangle = bvh.intersect(
+        scene.tree,
+        scene.triangles,
+        np.broadcast_to(view.position, directions.shape),
+        directions,
+    )
+    hit = np.where(
+        triangle >= 0, scene.triangle_mesh[np.maximum(triangle, 0)], -1
+    )
+    return shade(depth, hit, scene.colors, *depth_bounds), depth, hit
+
+
+def trace_pixels(
+    scene: SceneArrays,
+    view: View,
+    depth_bounds: tuple[float, float],
+    ys: np.ndarray,
+    xs: np.ndarray,
+    buffers: dict[str, np.ndarray],
+) -> None:
+    """traces the centers of the pixels (ys, xs) into buffers"""
+    color, depth, hit = sample_rays(
+        scene, view, depth_bounds, ys + 0.5, xs + 0.5
+    )
+    buffers["color"][ys, xs] = color
+    buffers["depth"][ys, xs] = depth
+    buffers["hit"][ys, xs] = hit
+
+
+def sample_offsets(samples: int) -> np.ndarray:
+    """(samples, 2) subpixel (y, x) points evenly spread over a pixel,
+    the first is its center"""
+    index = np.arange(samples)[:, None]
+    return (0.5 + index / np.array([PLASTIC, PLASTIC**2])) % 1
+
+
+def edge_scores(buffers: dict[str, np.ndarray]) -> np.ndarray:
+    """the largest channel difference of every pixel to its neighbours as
+    a share of 255, plus 1 where a mesh or depth edge runs beside it"""
+    color = buffers["color"].astype(np.int16)
+    depth, hit = buffers["depth"], buffers["hit"]
+    scores = np.zeros(depth.shape, dtype=np.float64)
+    for axis in (0, 1):
+        # each pixel against the next one along axis
+        here: list[slice] = [slice(None), slice(None)]
+        there: list[slice] = [slice(None), slice(None)]
+        here[axis], there[axis] = slice(0, -1), slice(1, None)
+        near, far = tuple(here), tuple(there)
+        contrast = np.abs(color[near] - color[far]).max(axis=-1) / 255
+        # misses are inf and inf - inf is nan, the mesh ids tell those apart
+        with np.errstate(invalid="ignore"):
+            edge = (hit[near] != hit[far]) | (
+                np.abs(depth[near] - depth[far])
+                > DEPTH_EDGE * np.minimum(depth[near], depth[far])
+            )
+        difference = contrast + edge
+        np.maximum(scores[near], difference, out=scores[near])
+        np.maximum(scores[far], difference, out=scores[far])
+    return scores
+
+
+def edge_pixels(
+    buffers: dict[str, np.ndarray], count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """row major (ys, xs) of at most count pixels most worth antialiasing"""
+    scores = edge_scores(buffers).ravel()
+    count = min(count, int(np.count_nonzero(scores > CONTRAST)))
+    if count <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    best = np.sort(np.argpartition(-scores, count - 1)[:count])
+    return np.divmod(best, buffers["depth"].shape[1])
+
+
+def antialias_pixels(
+    scene: SceneArrays,
+    view: View,
+    depth_bounds: tuple[float, float],
+    ys: np.ndarray,
+    xs: np.ndarray,
+    offsets: np.ndarray,
+    buffers: dict[str, np.ndarray],
+) -> None:
+    """averages the traced color of the pixels (ys, xs) with samples at
+    offsets within them"""
+    color, _, _ = sample_rays(
+        scene,
+        view,
+        depth_bounds,
+        (ys[:, None] + offsets[:, 0]).ravel(),
+        (xs[:, None] + offsets[:, 1]).ravel(),
+    )
+    total = buffers["color"][ys, xs].astype(np.float64)
+    total += color.reshape(len(ys), len(offsets), 3).sum(axis=1)
+    buffers["color"][ys, xs] = np.round(total / (len(offsets) + 1))
+
+
+def upscale(
+    color: np.ndarray, stride: int, out: view_types.Raster | None = None
+) -> view_types.Raster:
+    """blows every stride-th pixel up into a stride x stride block, written
+    into out when given"""
+    if out is None:
+        out = np.empty_like(color)
+    coarse = color[::stride, ::stride]
+    for row in range(stride):
+        for col in range(stride):
+            block = out[row::stride, col::stride]
+            block[...] = coarse[: block.shape[0], : block.shape[1]]
+    return out
+
+
+def finish(pool: "TracePool", futures: list[Future]) -> Iterator[None]:
+    """yields None until futures are done, closing cancels them"""
+    try:
+        while wait(futures, POLL_INTERVAL).not_done:
+            yield None
+    finally:
+        pool.cancel(futures)
+    for future in futures:
+        future.result()
+
+
+def progressive(
+    display: view_types.Display,
+    meshes: Meshes,
+    cam: camera.Camera,
+    scene: bvh.SceneBVH | None = None,
+    pool: "TracePool | None" = None,
+    passes: tuple[int, ...] = PASSES,
+    samples: int = 1,
+    ray_budget: int | None = None,
+    rasters: RasterPool | None = None,
+) -> Iterator[view_types.Raster | None]:
+    """traces the frame in passes of decreasing pixel stride and yields a
+    (height, width, 3) preview after every pass, the last is the full
+    frame. in between it yields None after a bounded amount of work so
+    the caller can handle events. closing the generator cancels the
+    refinement
+
+    scene, pool, samples, ray_budget and rasters are used like in render,
+    the antialiased frame comes after the full one"""
+    if scene is None:
+        scene = bvh.SceneBVH()
+    scene.update(meshes)
+    view = camera_view(display, cam)
+    depth_bounds = depth_range(scene.tree, view.position)
+    if pool is not None and pool.workers <= 1:
+        pool = None
+    arrays = SceneArrays.from_scene(scene)
+    if pool is not None:
+        buffers = pool.share_frame(view, arrays, scene.generation)
+    else:
+        buffers = frame_buffers(view)
+
+    skip = 0
+    for stride in passes:
+        if pool is not None:
+            yield from finish(
+                pool, pool.submit_pass(view, depth_bounds, stride, skip)
+            )
+        else:
+            ys, xs = pixel_grid(
+                slice(0, view.height), slice(0, view.width), stride, skip
+            )
+            for start in range(0, len(ys), STEP_PIXELS):
+                if start:
+                    yield None
+                pixels = slice(start, start + STEP_PIXELS)
+                trace_pixels(
+                    arrays, view, depth_bounds, ys[pixels], xs[pixels], buffers
+                )
+        yield upscale(buffers["color"], stride, lend(rasters, display))
+        skip = stride
+
+    if samples <= 1:
+        return
+    if ray_budget is None:
+        ray_budget = view.width * view.height
+    offsets = sample_offsets(samples)[1:]
+    ys, xs = edge_pixels(buffers, ray_budget // len(offsets))
+    if pool is not None:
+        yield from finish(
+            pool, pool.submit_samples(view, depth_bounds, ys, xs, offsets)
+        )
+    else:
+        step = max(STEP_PIXELS // len(offsets), 1)
+        for start in range(0, len(ys), step):
+            yield None
+            pixels = slice(start, start + step)
+            antialias_pixels(
+                arrays,
+                view,
+                depth_bounds,
+                ys[pixels],
+                xs[pixels],
+                offsets,
+                buffers,
+            )
+    yield upscale(buffers["color"], 1, lend(rasters, display))
+
+
+def lend(
+    rasters: RasterPool | None, display: view_types.Display
+) -> view_types.Raster | None:
+    return None if rasters is None else rasters.acquire(display)
+
 
 def render(
     display: view_types.Display,
     meshes: Meshes,
     cam: camera.Camera,
+    scene: bvh.SceneBVH | None = None,
+    pool: "TracePool | None" = None,
+    samples: int = 1,
+    ray_budget: int | None = None,
+    rasters: RasterPool | None = None,
 ) -> view_types.Raster:
-    return np.random.randint(0, 256, size=(display.width, display.height, 3), dtype=np.uint8)
+    """(height, width, 3) uint8 image of meshes seen from cam
+
+    scene keeps the acceleration structures between frames, only meshes
+    that changed since the last frame are rebuilt. with a pool of more
+    than one worker the frame is traced tile by tile on it
+
+    samples above 1 antialiases adaptively with up to that many samples
+    in the pixels on edges, spending at most ray_budget rays on top of
+    one per pixel (by default as many as the frame has pixels)
+
+    frames are written into rasters lent by rasters when given"""
+    raster = None
+    for frame in progressive(
+        display, meshes, cam, scene, pool, (1,), samples, ray_budget, rasters
+    ):
+        if frame is not None:
+            raster = frame
+    assert raster is not None
+    return raster
+
+
+def publish(arrays: dict[str, np.ndarray]) -> tuple[SharedMemory, Layout]:
+    """copies arrays into a new shared block"""
+    layout: Layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = (offset, array.shape, array.dtype.str)
+        offset = scene_file.align(offset + array.nbytes)
+    block = SharedMemory(create=True, size=max(offset, 1))
+    for name, array in arrays.items():
+        write_array(block, layout[name][0], np.ascontiguousarray(array))
+    return block, layout
+
+
+def map_arrays(block: SharedMemory, layout: Layout) -> dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(shape, np.dtype(dtype), block.buf, offset)
+        for name, (offset, shape, dtype) in layout.items()
+    }
+
+
+def release(block: SharedMemory | None) -> None:
+    if block is not None:
+        block.close()
+        block.unlink()
+
+
+# blocks mapped by this worker process and the arrays viewed in them
+worker_blocks: dict[str, tuple[SharedMemory, dict[str, np.ndarray]]] = {}
+
+
+def worker_arrays(name: str, layout: Layout) -> dict[str, np.ndarray]:
+    cached = worker_blocks.get(name)
+    if cached is None:
+        block = attach(name)
+        cached = worker_blocks[name] = (block, map_arrays(block, layout))
+    return cached[1]
+
+
+def forget_blocks(keep: set[str]) -> None:
+    """unmaps blocks of earlier scenes and frames, the parent unlinks
+    them"""
+    for name in [name for name in worker_blocks if name not in keep]:
+        block, arrays = worker_blocks.pop(name)
+        # the views have to go before the mapping can be closed
+        arrays.clear()
+        block.close()
+
+
+def trace_tile(
+    geometry: tuple[str, Layout],
+    frame: tuple[str, Layout],
+    view: View,
+    depth_bounds: tuple[float, float],
+    rows: slice,
+    cols: slice,
+    stride: int,
+    skip: int,
+) -> None:
+    """runs in the workers, traces the pixels of one tile of a pass into
+    the shared frame"""
+    forget_blocks({geometry[0], frame[0]})
+    trace_pixels(
+        SceneArrays.from_shared(worker_arrays(*geometry)),
+        view,
+        depth_bounds,
+        *pixel_grid(rows, cols, stride, skip),
+        worker_arrays(*frame),
+    )
+
+
+def antialias_tile(
+    geometry: tuple[str, Layout],
+    frame: tuple[str, Layout],
+    view: View,
+    depth_bounds: tuple[float, float],
+    ys: np.ndarray,
+    xs: np.ndarray,
+    offsets: np.ndarray,
+) -> None:
+    """runs in the workers, antialiases a share of the edge pixels in the
+    shared frame"""
+    forget_blocks({geometry[0], frame[0]})
+    antialias_pixels(
+        SceneArrays.from_shared(worker_arrays(*geometry)),
+        view,
+        depth_bounds,
+        ys,
+        xs,
+        offsets,
+        worker_arrays(*frame),
+    )
+
+
+class TracePool:
+    """process pool and shared memory kept alive between frames"""
+
+    workers: int
+    tile_size: int
+    pool: ProcessPoolExecutor | None
+    # shared copy of the scene and the SceneBVH generation it holds
+    geometry: SharedMemory | None
+    geometry_layout: Layout
+    generation: int | None
+    # shared color, depth and mesh id buffers of the last frame
+    frame: SharedMemory | None
+    frame_layout: Layout
+
+    def __init__(self, workers: int | None = None, tile_size: int = TILE_SIZE):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.tile_size = tile_size
+        self.pool = None
+        self.geometry = None
+        self.geometry_layout = {}
+        self.generation = None
+        self.frame = None
+        self.frame_layout = {}
+        atexit.register(self.close)
+
+    def configure(self, workers: int, tile_size: int) -> None:
+        """changes the worker count (restarting the pool) and tile size"""
+        if workers != self.workers and self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.workers = workers
+        self.tile_size = tile_size
+
+    def start(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=get_context("spawn")
+            )
+        return self.pool
+
+    def share_frame(
+        self, view: View, scene: SceneArrays, generation: int | None
+    ) -> dict[str, np.ndarray]:
+        """publishes scene if generation is new and returns the shared
+        frame buffers, reallocated when the view's size changed"""
+        if self.geometry is None or self.generation != generation:
+            release(self.geometry)
+            self.geometry, self.geometry_layout = publish(scene.shared())
+            self.generation = generation
+        if self.frame is None or self.frame_layout["depth"][1] != (
+            view.height,
+            view.width,
+        ):
+            release(self.frame)
+            self.frame, self.frame_layout = publish(frame_buffers(view))
+        return map_arrays(self.frame, self.frame_layout)
+
+    def tiles(self, view: View, stride: int) -> list[tuple[slice, slice]]:
+        """tiles of about tile_size x tile_size pixels of a pass"""
+        size = self.tile_size * stride
+        return [
+            (
+                slice(row, min(row + size, view.height)),
+                slice(col, min(col + size, view.width)),
+            )
+            for row in range(0, view.height, size)
+            for col in range(0, view.width, size)
+        ]
+
+    def submit_pass(
+        self,
+        view: View,
+        depth_bounds: tuple[float, float],
+        stride: int,
+        skip: int,
+    ) -> list[Future]:
+        """queues the tiles of a pass over the frame from share_frame"""
+        assert self.geometry is not None and self.frame is not None
+        geometry = (self.geometry.name, self.geometry_layout)
+        frame = (self.frame.name, self.frame_layout)
+        pool = self.start()
+        return [
+            pool.submit(
+                trace_tile,
+                geometry,
+                frame,
+                view,
+                depth_bounds,
+                rows,
+                cols,
+                stride,
+                skip,
+            )
+            for rows, cols in self.tiles(view, stride)
+        ]
+
+    def submit_samples(
+        self,
+        view: View,
+        depth_bounds: tuple[float, float],
+        ys: np.ndarray,
+        xs: np.ndarray,
+        offsets: np.ndarray,
+    ) -> list[Future]:
+        """queues antialiasing the pixels (ys, xs) of the frame from
+        share_frame, in shares of about a tile's rays"""
+        assert self.geometry is not None and self.frame is not None
+        geometry = (self.geometry.name, self.geometry_layout)
+        frame = (self.frame.name, self.frame_layout)
+        pool = self.start()
+        step = max(self.tile_size**2 // len(offsets), 1)
+        return [
+            pool.submit(
+                antialias_tile,
+                geometry,
+                frame,
+                view,
+                depth_bounds,
+                ys[start : start + step],
+                xs[start : start + step],
+                offsets,
+            )
+            for start in range(0, len(ys), step)
+        ]
+
+    def cancel(self, futures: list[Future]) -> None:
+        """drops the queued tiles and waits for the running ones, so none
+        of them writes into the frame after the next pass started"""
+        for future in futures:
+            future.cancel()
+        wait(futures)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        release(self.geometry)
+        release(self.frame)
+        self.geometry = None
+        self.frame = None
+        self.generation = None
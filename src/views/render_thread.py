@@ -0,0 +1,141 @@
+"""renders frames of a Viewer on a background thread, so the UI thread only
+hands over requests and shows the frames that come back
+
+only the newest request is kept. one made while another is waiting
+replaces it, one made while a frame renders stops that frame at its next
+pass (ray traced frames refine over several). a burst of requests costs
+the frame in flight plus one frame of the last request
+
+the scene is read by the thread while it renders a pass, anything that
+changes or saves the meshes has to hold scene_lock"""
+
+from collections.abc import Callable
+from contextlib import closing
+from dataclasses import dataclass
+from functools import partial
+from threading import Condition, Lock, Thread
+from views import view_types
+from views.view import Viewer
+from mesh.mesh import Meshes
+from mesh import lod
+
+# what next gives once a render has yielded its last frame
+FINISHED = object()
+
+
+@dataclass
+class Request:
+    # numbers requests in the order they were made
+    ticket: int
+    display: view_types.Display
+    # camera and settings of the viewer when the request was made
+    view: Viewer
+
+
+class RenderThread:
+    viewer: Viewer
+    meshes: Meshes
+    # called on the render thread with the ticket of every frame finished
+    # and how many meshes were culled from it
+    deliver: Callable[[int, view_types.Raster, int], None]
+    # called on the render thread with the ticket of a request that raised
+    # and what it raised, the thread goes on with the next request
+    fail: Callable[[int, Exception], None] | None
+
+    # held while a pass reads the scene
+    scene_lock: Lock
+    # guards pending, ticket and running
+    wake: Condition
+    pending: Request | None
+    # ticket of the newest request
+    ticket: int
+    running: bool
+    thread: Thread
+
+    def __init__(
+        self,
+        viewer: Viewer,
+        meshes: Meshes,
+        deliver: Callable[[int, view_types.Raster, int], None],
+        fail: Callable[[int, Exception], None] | None = None,
+    ):
+        """deliver gets every frame rendered with the ticket of its request
+        and the number of meshes culled from it, fail gets the ticket and
+        the exception of every request that raised. both run on the render
+        thread and should only hand over to the UI thread"""
+        self.viewer = viewer
+        self.meshes = meshes
+        self.deliver = deliver
+        self.fail = fail
+        self.scene_lock = Lock()
+        self.wake = Condition()
+        self.pending = None
+        self.ticket = 0
+        self.running = True
+        self.thread = Thread(target=self.run, name="render", daemon=True)
+        self.thread.start()
+
+    def request(self, display: view_types.Display) -> int:
+        """asks for a frame of the viewer's current camera and settings,
+        returns the ticket its frames will be delivered with"""
+        with self.wake:
+            self.ticket += 1
+            self.pending = Request(
+                self.ticket, display, self.viewer.snapshot()
+            )
+            self.wake.notify()
+            return self.ticket
+
+    def is_stale(self, ticket: int) -> bool:
+        """whether a newer request than ticket was made"""
+        with self.wake:
+            return ticket != self.ticket or not self.running
+
+    def next_request(self) -> Request | None:
+        """waits for a request, None once closed"""
+        with self.wake:
+            while self.running and self.pending is None:
+                self.wake.wait()
+            request = self.pending
+            self.pending = None
+            return request if self.running else None
+
+    def run(self) -> None:
+        while (request := self.next_request()) is not None:
+            try:
+                self.render(request)
+            except Exception as e:
+                # one bad frame must not leave the window without frames
+                print(f"[ERROR] failed to render frame {request.ticket}: {e}")
+                if self.fail is not None:
+                    self.fail(request.ticket, e)
+
+    def render(self, request: Request) -> None:
+        """delivers the frames of request until it is done or stale"""
+        frames = request.view.render_progressive(request.display, self.meshes)
+        with closing(frames):
+            while not self.is_stale(request.ticket):
+                with self.scene_lock:
+                    raster = next(frames, FINISHED)
+                if raster is FINISHED:
+                    break
+                if raster is not None:
+                    self.deliver(request.ticket, raster, request.view.culled)
+        if request.view.levels_pending:
+            # the frame drew full meshes in place of levels that were
+            # still building, it is drawn again once they are built
+            lod.when_built(partial(self.redraw, request))
+
+    def redraw(self, request: Request) -> None:
+        """renders request again unless a newer one was made"""
+        with self.wake:
+            if request.ticket == self.ticket and self.pending is None:
+                self.pending = request
+                self.wake.notify()
+
+    def close(self) -> None:
+        """stops after the pass in flight and waits for the thread"""
+        with self.wake:
+            self.running = False
+            self.wake.notify()
+        self.thread.join()
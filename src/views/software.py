@@ -0,0 +1,390 @@
+"""triangle rasterizer in numpy, draws frames without VTK or OpenGL
+
+vertices go into camera space through the camera's view matrix and onto
+pixels through its perspective and viewport matrices (an orthographic
+scale for parallel projection), the camera keeps them between frames.
+every triangle tests the pixel centers in its bounding box with edge
+functions, boxes of about the same size are tested together in one batch
+and boxes larger than MAX_BOX are split. the nearest fragment of a pixel
+wins in a float32 z-buffer and takes the flat color of its mesh
+
+triangles with a corner nearer to the camera than NEAR are left out rather
+than clipped"""
+
+from views import view_types, camera, rasterize
+from views.bvh import unit_color
+from mesh.mesh import Meshes, Vertices
+from mesh import lod
+import numpy as np
+
+# near plane distance and field of view, the same as render_pers
+NEAR = 1.0
+FOV = np.pi / 2
+
+BACKGROUND = np.array([255, 255, 255], dtype=np.uint8)
+
+# largest bounding box edge in pixels, larger boxes are split into parts
+MAX_BOX = 64
+# candidate pixels tested in one batch
+FRAGMENT_CHUNK = 1 << 18
+
+
+def orthographic_matrix(scale: np.float64) -> camera.Vertices_H:
+    """parallel projection of camera space with the same orientation as
+    perspective_matrix, scale is half the height of the view in world
+    units"""
+    return np.array(
+        [
+            [-1 / scale, 0, 0, 0],
+            [0, -1 / scale, 0, 0],
+            [0, 0, 1, 0],
+            [0, 0, 0, 1],
+        ],
+        dtype=np.float64,
+    )
+
+
+def screen_matrix(display: view_types.Display) -> camera.Vertices_H:
+    """mirrors x back (the projections above flip both axes and image rows
+    already run down) and keeps pixels square, the field of view is
+    vertical"""
+    return np.diag(
+        [-float(display.height) / float(display.width), 1.0, 1.0, 1.0]
+    )
+
+
+def project(
+    vertices: Vertices,
+    cam: camera.Camera,
+    display: view_types.Display,
+    perspective: bool,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """pixel (x, y) of every vertex, with pixel centers on integers, its
+    distance in front of the camera and its nearness, which is larger for
+    nearer vertices and linear across the screen"""
+    view = rasterize.transform_vertices(vertices, cam.view_matrix())
+    distance = -view[:, 2]
+    if perspective:
+        projection = cam.projection_matrix(np.float64(NEAR), np.float64(FOV))
+        with np.errstate(divide="ignore"):
+            nearness = 1 / distance
+    else:
+        parallel_scale = cam.get_parallel_scale()
+        if parallel_scale is None:
+            parallel_scale = cam.focal_distance() * np.tan(FOV / 2)
+        projection = orthographic_matrix(parallel_scale)
+        nearness = -distance
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pixels = rasterize.transform_vertices(
+            view,
+            np.linalg.multi_dot(
+                [
+                    camera.viewport_matrix(display),
+                    screen_matrix(display),
+                    projection,
+                ]
+            ),
+        )[:, :2]
+    return pixels, distance, nearness
+
+
+def concatenate_ranges(rows: list[slice]) -> np.ndarray:
+    return np.concatenate(
+        [np.arange(row.start, row.stop) for row in rows]
+        or [np.empty(0, dtype=np.int64)]
+    )
+
+
+class SoftwareContext:
+    """every level of detail of the scene gathered into flat arrays,
+    rebuilt when the meshes or their levels change, and the z-buffer,
+    reallocated when the display size changes"""
+
+    # Meshes.version and Meshes.lod_version the arrays were gathered at
+    version: tuple[int, int] | None
+    vertices: Vertices
+    # (T, 3) indices into vertices and (T + 1, 3) uint8 color of every
+    # triangle followed by the background, which nearest = -1 picks
+    triangles: np.ndarray
+    triangle_color: np.ndarray
+    # rows of each (mesh id, level) in vertices and triangles
+    vertex_rows: dict[tuple[str, int], slice]
+    triangle_rows: dict[tuple[str, int], slice]
+    # nearness of the nearest fragment and its triangle (-1 for none)
+    closeness: np.ndarray
+    nearest: np.ndarray
+
+    def __init__(self):
+        self.version = None
+        self.vertices = np.empty((0, 3), dtype=np.float64)
+        self.triangles = np.empty((0, 3), dtype=np.int64)
+        self.triangle_color = BACKGROUND[None, :]
+        self.vertex_rows = {}
+        self.triangle_rows = {}
+        self.closeness = np.empty((0, 0), dtype=np.float32)
+        self.nearest = np.empty((0, 0), dtype=np.int64)
+
+    def sync(self, meshes: Meshes) -> None:
+        if (meshes.version, meshes.lod_version) == self.version:
+            return
+        vertices: list[Vertices] = []
+        triangles: list[np.ndarray] = []
+        colors: list[np.ndarray] = []
+        vertex_rows: dict[tuple[str, int], slice] = {}
+        triangle_rows: dict[tuple[str, int], slice] = {}
+        offset = triangle_offset = 0
+        for id in meshes.meshes:
+            record = meshes.meshes.record(id)
+            color = np.round(np.clip(unit_color(record.color), 0, 1) * 255)
+            levels = meshes.meshes.finished_levels(id)
+            if levels is None:
+                levels = [
+                    lod.Level(
+                        record.vertices, lod.triangulate(record.faces), 0
+                    )
+                ]
+            for level, arrays in enumerate(levels):
+                key = (id, level)
+                vertices.append(np.asarray(arrays.vertices, dtype=np.float64))
+                triangles.append(arrays.triangles + offset)
+                colors.append(np.broadcast_to(color, arrays.triangles.shape))
+                vertex_rows[key] = slice(offset, offset + len(vertices[-1]))
+                triangle_rows[key] = slice(
+                    triangle_offset, triangle_offset + len(arrays.triangles)
+                )
+                offset = vertex_rows[key].stop
+                triangle_offset = triangle_rows[key].stop
+        self.vertex_rows = vertex_rows
+        self.triangle_rows = triangle_rows
+        if vertices:
+            self.vertices = np.concatenate(vertices)
+            self.triangles = np.concatenate(triangles)
+            self.triangle_color = np.concatenate(
+                [*colors, BACKGROUND[None, :]]
+            ).astype(np.uint8)
+        else:
+            self.vertices = np.empty((0, 3), dtype=np.float64)
+            self.triangles = np.empty((0, 3), dtype=np.int64)
+            self.triangle_color = BACKGROUND[None, :]
+        self.version = (meshes.version, meshes.lod_version)
+
+    def rows(
+        self, visible: set[str] | None, levels: dict[str, int]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """indices of the vertices and triangles of the meshes in visible
+        (every mesh when None) at their levels (0 when not in levels)"""
+        keys = [
+            (id, levels.get(id, 0))
+            for id, level in self.vertex_rows
+            if level == 0 and (visible is None or id in visible)
+        ]
+        return (
+            concatenate_ranges([self.vertex_rows[key] for key in keys]),
+            concatenate_ranges([self.triangle_rows[key] for key in keys]),
+        )
+
+    def clear_buffers(self, display: view_types.Display) -> None:
+        shape = (int(display.height), int(display.width))
+        if self.closeness.shape != shape:
+            self.closeness = np.empty(shape, dtype=np.float32)
+            self.nearest = np.empty(shape, dtype=np.int64)
+        self.closeness.fill(-np.inf)
+        self.nearest.fill(-1)
+
+
+def boxes(corners: np.ndarray, width: int, height: int) -> np.ndarray:
+    """(T, 4) x0, y0, x1, y1 of the pixels whose centers are in the
+    bounding boxes of (T, 3, 2) corners, clipped to the screen"""
+    lower = np.ceil(corners.min(axis=1))
+    upper = np.floor(corners.max(axis=1)) + 1
+    return np.concatenate(
+        [
+            np.clip(lower, 0, [width, height]),
+            np.clip(upper, 0, [width, height]),
+        ],
+        axis=1,
+    ).astype(np.int64)
+
+
+def split_boxes(box: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """parts of at most MAX_BOX x MAX_BOX pixels covering box and the
+    index of the box each part came from"""
+    width, height = box[:, 2] - box[:, 0], box[:, 3] - box[:, 1]
+    across = -(-width // MAX_BOX)
+    parts = across * -(-height // MAX_BOX)
+    owner = np.repeat(np.arange(len(box)), parts)
+    # index of every part within its box
+    index = np.arange(len(owner)) - np.repeat(np.cumsum(parts) - parts, parts)
+    row, col = np.divmod(index, across[owner])
+    x0 = box[owner, 0] + col * MAX_BOX
+    y0 = box[owner, 1] + row * MAX_BOX
+    return (
+        np.stack(
+            [
+                x0,
+                y0,
+                np.minimum(x0 + MAX_BOX, box[owner, 2]),
+                np.minimum(y0 + MAX_BOX, box[owner, 3]),
+            ],
+            axis=1,
+        ),
+        owner,
+    )
+
+
+def size_class(length: np.ndarray) -> np.ndarray:
+    """the power of two at or above length"""
+    return 1 << np.ceil(np.log2(np.maximum(length, 1))).astype(np.int64)
+
+
+def signed_area(corners: np.ndarray) -> np.ndarray:
+    """twice the area of (T, 3, 2) triangles, negative for clockwise"""
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    return (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        c[:, 0] - a[:, 0]
+    )
+
+
+def cover(
+    corners: np.ndarray,
+    nearness: np.ndarray,
+    box: np.ndarray,
+    height: int,
+    width: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """tests the pixels of boxes up to height x width against their (n, 3,
+    2) triangle corners, returns the row and column of every covered
+    pixel, its interpolated nearness and which of the n it belongs to"""
+    grid_y, grid_x = np.divmod(np.arange(height * width), width)
+    ys = box[:, 1, None] + grid_y
+    xs = box[:, 0, None] + grid_x
+    inside = (ys < box[:, 3, None]) & (xs < box[:, 2, None])
+
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    area = signed_area(corners)
+    # edge functions opposite each corner over the area are its weight
+    weights = []
+    for start, end in ((b, c), (c, a), (a, b)):
+        edge = (end[:, 0, None] - start[:, 0, None]) * (
+            ys - start[:, 1, None]
+        ) - (end[:, 1, None] - start[:, 1, None]) * (xs - start[:, 0, None])
+        weight = edge / area[:, None]
+        inside &= weight >= 0
+        weights.append(weight)
+
+    owner, pixel = np.nonzero(inside)
+    depth = (
+        weights[0][owner, pixel] * nearness[owner, 0]
+        + weights[1][owner, pixel] * nearness[owner, 1]
+        + weights[2][owner, pixel] * nearness[owner, 2]
+    )
+    return ys[owner, pixel], xs[owner, pixel], depth, owner
+
+
+def depth_test(
+    context: SoftwareContext,
+    ys: np.ndarray,
+    xs: np.ndarray,
+    depth: np.ndarray,
+    triangle: np.ndarray,
+) -> None:
+    """keeps the nearest of the fragments on every pixel if it is nearer
+    than what the z-buffer holds"""
+    width = context.closeness.shape[1]
+    pixel = ys * width + xs
+    depth = depth.astype(np.float32)
+    order = np.lexsort((-depth, pixel))
+    pixel, depth, triangle = pixel[order], depth[order], triangle[order]
+    first = np.ones(len(pixel), dtype=bool)
+    first[1:] = pixel[1:] != pixel[:-1]
+    pixel, depth, triangle = pixel[first], depth[first], triangle[first]
+
+    closeness = context.closeness.reshape(-1)
+    nearest = context.nearest.reshape(-1)
+    nearer = depth > closeness[pixel]
+    closeness[pixel[nearer]] = depth[nearer]
+    nearest[pixel[nearer]] = triangle[nearer]
+
+
+def draw_triangles(
+    context: SoftwareContext,
+    candidates: np.ndarray,
+    pixels: np.ndarray,
+    distance: np.ndarray,
+    nearness: np.ndarray,
+) -> None:
+    """culls the triangles of context at candidates and draws the rest into
+    the z-buffer, the arrays are per vertex like project returns them"""
+    height, width = context.closeness.shape
+    # in front of the camera, not degenerate and on the screen
+    keep = candidates[
+        (distance[context.triangles[candidates]] >= NEAR).all(axis=1)
+    ]
+    corners = pixels[context.triangles[keep]]
+    box = boxes(corners, width, height)
+    visible = (
+        (signed_area(corners) != 0)
+        & (box[:, 2] > box[:, 0])
+        & (box[:, 3] > box[:, 1])
+    )
+    box, owner = split_boxes(box[visible])
+    keep = keep[visible][owner]
+
+    # boxes of one size class share a grid of candidate pixels
+    box_height = size_class(box[:, 3] - box[:, 1])
+    box_width = size_class(box[:, 2] - box[:, 0])
+    for size_height, size_width in set(
+        zip(box_height.tolist(), box_width.tolist())
+    ):
+        group = np.flatnonzero(
+            (box_height == size_height) & (box_width == size_width)
+        )
+        step = max(FRAGMENT_CHUNK // (size_height * size_width), 1)
+        for start in range(0, len(group), step):
+            part = group[start : start + step]
+            triangles = context.triangles[keep[part]]
+            ys, xs, depth, which = cover(
+                pixels[triangles],
+                nearness[triangles],
+                box[part],
+                size_height,
+                size_width,
+            )
+            depth_test(context, ys, xs, depth, keep[part][which])
+
+
+def render(
+    display: view_types.Display,
+    meshes: Meshes,
+    cam: camera.Camera,
+    perspective: bool = True,
+    context: SoftwareContext | None = None,
+    visible: set[str] | None = None,
+    levels: dict[str, int] | None = None,
+    out: view_types.Raster | None = None,
+) -> view_types.Raster:
+    """(height, width, 3) uint8 image of meshes seen from cam, every mesh
+    in its flat color. meshes not in visible (when given) are neither
+    projected nor drawn, levels picks the level of detail drawn of the
+    meshes in it. the image is written into out when given"""
+    if context is None:
+        context = SoftwareContext()
+    context.sync(meshes)
+    context.clear_buffers(display)
+
+    if cam.get_position() is not None and len(context.triangles):
+        rows, candidates = context.rows(visible, levels or {})
+        # the rows of culled meshes are left unset, nothing reads them
+        pixels = np.empty((len(context.vertices), 2), dtype=np.float64)
+        distance = np.empty(len(context.vertices), dtype=np.float64)
+        nearness = np.empty(len(context.vertices), dtype=np.float64)
+        pixels[rows], distance[rows], nearness[rows] = project(
+            context.vertices[rows], cam, display, perspective
+        )
+        draw_triangles(context, candidates, pixels, distance, nearness)
+
+    if out is None:
+        out = np.empty((*context.closeness.shape, 3), dtype=np.uint8)
+    # pixels nothing covers have nearest = -1, the background's row
+    np.take(context.triangle_color, context.nearest, axis=0, out=out)
+    return out
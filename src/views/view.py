@@ -1,13 +1,24 @@
-from views import rasterize, view_types, ray_trace, camera
+from views import rasterize, view_types, ray_trace, camera, bvh, software
+from views import frustum
+from mesh import lod
+from views.frame_cache import FrameCache
+from views.raster_pool import RasterPool
 from mesh.mesh import Meshes
+from typing import Iterator
 from enum import Enum
+import copy
 import numpy as np
 
+# cells of the level of detail drawn may be this many pixels across
+LOD_PIXELS = 1.0
+
 
 class Viewer:
     class Rendering(Enum):
         RAY_TRACE = 1
         RASTERIZE = 2
+        # numpy z-buffer, needs no OpenGL context
+        SOFTWARE = 3
 
     class Perspective(Enum):
         ORTHOGRAPHIC = 1
@@ -18,29 +29,317 @@ class Viewer:
 
     cam: camera.Camera
 
+    # render windows kept alive between frames, one per projection since
+    # the perspective path draws already projected geometry
+    orth_context: rasterize.RenderContext
+    pers_context: rasterize.RenderContext
+    pers_buffers: rasterize.ProjectionBuffers
+    # small meshes merged by color for both of them
+    scene_batches: rasterize.SceneBatches
+    # flattened scene and z-buffer of the software rasterizer
+    soft_context: software.SoftwareContext
+    # ray tracing acceleration structures, rebuilt per mesh as they change
+    ray_scene: bvh.SceneBVH
+    # worker processes tracing tiles, started on the first ray traced frame
+    trace_pool: ray_trace.TracePool
+    # most rays per pixel of adaptive antialiasing (1 turns it off) and the
+    # extra rays it may spend per frame, see ray_trace.render
+    samples: int
+    ray_budget: int | None
+    # finished frames of views rendered before
+    frames: FrameCache
+    # rasters every backend draws its frames into
+    rasters: RasterPool
+    # meshes left out of the last frame rendered for being outside the
+    # view, counted for cached frames too
+    culled: int = 0
+    # draw decimated levels of meshes that are small on screen
+    use_lod: bool = True
+    # the last frame drawn asked for level of detail chains that were
+    # still building, RenderThread draws it again once they are done
+    levels_pending: bool = False
+    # draw small meshes of the same color as one batch in the vedo paths
+    use_batches: bool = True
+
     def change_view_mode(self, mode: Perspective):
         self.view_mode = mode
 
-    def __init__(self, cam: camera.Camera | None = None):
+    def __init__(
+        self,
+        cam: camera.Camera | None = None,
+        workers: int | None = None,
+        tile_size: int = ray_trace.TILE_SIZE,
+        samples: int = 1,
+        ray_budget: int | None = None,
+    ):
+        """workers is the number of processes ray tracing uses (every core
+        when None, 1 traces on the calling thread) and tile_size the edge
+        length of the tiles they are given. samples and ray_budget set up
+        ray tracing's adaptive antialiasing"""
         self.cam = camera.Camera()
+        self.orth_context = rasterize.RenderContext()
+        self.pers_context = rasterize.RenderContext()
+        self.pers_buffers = rasterize.ProjectionBuffers()
+        self.scene_batches = rasterize.SceneBatches()
+        self.soft_context = software.SoftwareContext()
+        self.ray_scene = bvh.SceneBVH()
+        self.trace_pool = ray_trace.TracePool(workers, tile_size)
+        self.samples = samples
+        self.ray_budget = ray_budget
+        self.frames = FrameCache()
+        self.rasters = RasterPool()
 
         self.cam.set_position(np.array([0, 0, 10], dtype=np.float64))
         self.cam.set_focal_point(np.array([50, 40, 50], dtype=np.float64))
 
+    def snapshot(self) -> "Viewer":
+        """a viewer with a copy of the camera and settings as they are now.
+        it shares the render contexts, caches and pools of this one, so
+        only one of them may render at a time"""
+        view = copy.copy(self)
+        view.cam = self.cam.copy()
+        return view
+
+    def frame_key(self, display: view_types.Display, meshes: Meshes) -> tuple:
+        """everything the frame of display depends on"""
+        key = (
+            self.render_mode,
+            self.view_mode,
+            self.cam.state(),
+            int(display.width),
+            int(display.height),
+            meshes.version,
+            meshes.lod_version if self.use_lod else 0,
+        )
+        if self.render_mode == self.Rendering.RAY_TRACE:
+            key += (self.samples, self.ray_budget)
+        if self.render_mode == self.Rendering.RASTERIZE:
+            key += (self.use_batches,)
+        return key
+
     def render(
         self,
         display: view_types.Display,
         meshes: Meshes,
     ) -> view_types.Raster:
+        """the frame of meshes seen through the camera, from self.frames if
+        this view was rendered before. frames are read only"""
+        raster = self.frames.get(self.frame_key(display, meshes))
+        if raster is None:
+            raster = self.draw(display, meshes)
+            self.store(display, meshes, raster)
+        else:
+            self.cull(display, meshes)
+        return raster
+
+    def store(
+        self,
+        display: view_types.Display,
+        meshes: Meshes,
+        raster: view_types.Raster,
+    ) -> None:
+        """caches a frame just drawn. drawing collects level of detail
+        chains that finished building, which changes meshes.lod_version,
+        so the key is taken after drawing. frames drawn while chains were
+        still building are not kept, the next request draws them again
+        with whatever finished since"""
+        if not self.levels_pending:
+            self.frames.put(self.frame_key(display, meshes), raster)
+
+    def view_volume(
+        self, display: view_types.Display
+    ) -> tuple[bool, float, float, float] | None:
+        """whether the current backend and projection see in perspective,
+        the half width and half height of what they see (at distance 1 in
+        perspective) and their near distance. None when nothing is culled
+        (ray tracing already skips what its rays miss)"""
+        if (
+            self.render_mode == self.Rendering.RAY_TRACE
+            or self.cam.get_position() is None
+            or self.cam.get_focal_point() is None
+        ):
+            return None
+        aspect = float(display.width) / float(display.height)
+        perspective = self.view_mode == self.Perspective.PERSPECTIVE
+        if self.render_mode == self.Rendering.SOFTWARE:
+            if perspective:
+                half_height = float(np.tan(software.FOV / 2))
+                return True, half_height * aspect, half_height, software.NEAR
+            scale = self.cam.get_parallel_scale()
+            if scale is None:
+                scale = self.cam.focal_distance() * np.tan(software.FOV / 2)
+            return False, scale * aspect, scale, software.NEAR
+        if perspective:
+            # render_pers projects to x / distance and y / distance before
+            # VTK sees anything. VTK then fits the image to what it got, so
+            # this only sizes levels of detail and cull leaves it alone
+            return True, 1.0, 1.0, 0.0
+        # render_orth draws through VTK's camera
+        view_angle = self.cam.get_view_angle()
+        if view_angle is None:
+            view_angle = ray_trace.VIEW_ANGLE
+        half_height = float(np.tan(np.deg2rad(view_angle) / 2))
+        return True, half_height * aspect, half_height, 0.0
+
+    def view_frustum(
+        self, display: view_types.Display
+    ) -> frustum.Frustum | None:
+        volume = self.view_volume(display)
+        if volume is None:
+            return None
+        perspective, half_width, half_height, near = volume
+        basis = self.cam.basis()
+        if perspective:
+            return frustum.perspective(*basis, half_width, half_height, near)
+        return frustum.orthographic(*basis, half_width, half_height, near)
+
+    def detail_levels(
+        self,
+        display: view_types.Display,
+        meshes: Meshes,
+        ids: list[str],
+    ) -> dict[str, int]:
+        """the level of detail to draw of each of ids, the coarsest whose
+        cells are at most LOD_PIXELS across at the nearest point of the
+        mesh's bounds. meshes whose chains are not built yet are left
+        out, asking starts building them"""
+        self.levels_pending = False
+        volume = self.view_volume(display)
+        if volume is None or not self.use_lod:
+            return {}
+        perspective, _, half_height, _ = volume
+        lower, upper = meshes.bounds(ids)
+        # world units one pixel covers at each mesh
+        pixel = np.full(len(ids), 2 * half_height / float(display.height))
+        if perspective:
+            eye = self.cam.get_position()
+            pixel *= np.linalg.norm(np.clip(eye, lower, upper) - eye, axis=1)
+        levels: dict[str, int] = {}
+        for id, size in zip(ids, pixel.tolist()):
+            chain = meshes.meshes.levels(id)
+            if chain is None:
+                self.levels_pending = True
+            if chain is not None and len(chain) > 1:
+                levels[id] = lod.pick(
+                    [level.cell for level in chain], size, LOD_PIXELS
+                )
+        return levels
+
+    def cull(
+        self, display: view_types.Display, meshes: Meshes
+    ) -> set[str] | None:
+        """ids of the meshes that can show up in the frame, None for all,
+        and counts the others in self.culled"""
+        self.culled = 0
+        if (
+            self.render_mode == self.Rendering.RASTERIZE
+            and self.view_mode == self.Perspective.PERSPECTIVE
+        ):
+            # render_pers lets VTK fit its camera to the meshes it is
+            # given, leaving some out would frame the rest differently
+            return None
+        view = self.view_frustum(display)
+        if view is None:
+            return None
+        ids = list(meshes.meshes)
+        inside = view.contains(*meshes.bounds(ids))
+        self.culled = len(ids) - int(np.count_nonzero(inside))
+        return {id for id, keep in zip(ids, inside) if keep}
+
+    def draw(
+        self,
+        display: view_types.Display,
+        meshes: Meshes,
+    ) -> view_types.Raster:
+        visible = self.cull(display, meshes)
+        levels = self.detail_levels(
+            display,
+            meshes,
+            list(meshes.meshes if visible is None else visible),
+        )
+        if self.render_mode == self.Rendering.RAY_TRACE:
+            return ray_trace.render(
+                display,
+                meshes,
+                self.cam,
+                self.ray_scene,
+                self.trace_pool,
+                self.samples,
+                self.ray_budget,
+                self.rasters,
+            )
+        out = self.rasters.acquire(display)
         if self.render_mode == self.Rendering.RASTERIZE:
+            batches = self.scene_batches if self.use_batches else None
             if self.view_mode == self.Perspective.PERSPECTIVE:
-                return rasterize.render_pers(display, meshes, self.cam)
-            return rasterize.render_orth(display, meshes, self.cam)
-        if self.render_mode == self.Rendering.RAY_TRACE:
-            return ray_trace.render(display, meshes, self.cam)
-        return np.random.randint(
-            0, 255, size=(display.width, display.height, 3), dtype=np.uint8
-        )
+                return rasterize.render_pers(
+                    display,
+                    meshes,
+                    self.cam,
+                    self.pers_context,
+                    self.pers_buffers,
+                    visible,
+                    levels,
+                    batches,
+                    out,
+                )
+            return rasterize.render_orth(
+                display,
+                meshes,
+                self.cam,
+                self.orth_context,
+                visible,
+                levels,
+                batches,
+                out,
+            )
+        if self.render_mode == self.Rendering.SOFTWARE:
+            return software.render(
+                display,
+                meshes,
+                self.cam,
+                self.view_mode == self.Perspective.PERSPECTIVE,
+                self.soft_context,
+                visible,
+                levels,
+                out,
+            )
+        out[...] = np.random.randint(0, 255, size=out.shape, dtype=np.uint8)
+        return out
+
+    def render_progressive(
+        self,
+        display: view_types.Display,
+        meshes: Meshes,
+    ) -> Iterator[view_types.Raster | None]:
+        """like render, but ray traced frames come as a coarse preview
+        refined over several passes, see ray_trace.progressive. other
+        modes yield their one frame. a cached frame is yielded alone, the
+        last frame of a refinement that ran to the end is cached"""
+        key = self.frame_key(display, meshes)
+        raster = self.frames.get(key)
+        if raster is not None:
+            self.cull(display, meshes)
+            yield raster
+            return
+        if self.render_mode != self.Rendering.RAY_TRACE:
+            raster = self.draw(display, meshes)
+            self.store(display, meshes, raster)
+            yield raster
+            return
+        for raster in ray_trace.progressive(
+            display,
+            meshes,
+            self.cam,
+            self.ray_scene,
+            self.trace_pool,
+            samples=self.samples,
+            ray_budget=self.ray_budget,
+            rasters=self.rasters,
+        ):
+            yield raster
+        if raster is not None:
+            self.frames.put(key, raster)
 
     def rotate_cam(self, vert: np.float64, hori: np.float64) -> None:
         vert = np.deg2rad(vert)
@@ -51,7 +350,7 @@ class Viewer:
             return
         focal_point = self.cam.get_focal_point()
         if focal_point is not None:
-            cam_coords -= focal_point
+            cam_coords = cam_coords - focal_point
 
         cv = np.cos(vert)
         sv = np.sin(vert)
@@ -80,20 +379,23 @@ class Viewer:
         cam_coords = np.dot(hori_rot, cam_coords)
 
         if focal_point is not None:
-            cam_coords += focal_point
+            cam_coords = cam_coords + focal_point
         self.cam.set_position(cam_coords)
 
     def zoom_cam(self, factor: np.float64) -> None:
         factor = 1 + factor / 100
+        if factor <= 0:
+            # would put the camera on or through its focal point
+            return
         cam_coords = self.cam.get_position()
         if cam_coords is None:
             return
         focal_point = self.cam.get_focal_point()
         if focal_point is not None:
-            cam_coords -= focal_point
+            cam_coords = cam_coords - focal_point
 
-        cam_coords *= factor
+        cam_coords = cam_coords * factor
 
         if focal_point is not None:
-            cam_coords += focal_point
+            cam_coords = cam_coords + focal_point
         self.cam.set_position(cam_coords)
@@ -10,3 +10,16 @@ Raster = Annotated[np.ndarray[Any, np.dtype[Any]], "M x N Raster"]
 class Display:
     width: np.int64
     height: np.int64
+
+    def scaled(self, scale: float) -> "Display":
+        """the display with both sides times scale, at least a pixel"""
+        return Display(
+            width=np.int64(max(1, round(float(self.width) * scale))),
+            height=np.int64(max(1, round(float(self.height) * scale))),
+        )
+
+    @classmethod
+    def of_raster(cls, raster: Raster) -> "Display":
+        """the resolution raster was rendered at"""
+        height, width = raster.shape[:2]
+        return cls(width=np.int64(width), height=np.int64(height))
@@ -0,0 +1,52 @@
+from mesh.mesh import Meshes
+from mesh import scene_file
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not on windows
+    resource = None
+
+# two arrays each, more arrays than the usual limit of 1024 open files
+MESHES = 600
+# open files allowed while loading, far fewer than the arrays
+OPEN_FILES = 256
+
+
+def square(x: float) -> tuple[np.ndarray, np.ndarray]:
+    vertices = np.array(
+        [[x, 0, 0], [x + 1, 0, 0], [x + 1, 1, 0], [x, 1, 0]],
+        dtype=np.float64,
+    )
+    return vertices, np.array([[0, 1, 2], [0, 2, 3]], dtype=np.int64)
+
+
+def test_load_many_arrays(tmp_path):
+    meshes = Meshes()
+    for i in range(MESHES):
+        meshes.add_mesh(*square(i), np.array([0.5, 0.5, 0.5]))
+    path = tmp_path / "scene.pb"
+    assert meshes.save(path, Meshes.Format.INDEXED)
+    assert scene_file.is_indexed(path)
+
+    loaded = Meshes()
+    if resource is None:
+        assert loaded.load(path)
+    else:
+        limits = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(
+            resource.RLIMIT_NOFILE,
+            (min(limits[0], OPEN_FILES), limits[1]),
+        )
+        try:
+            assert loaded.load(path)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, limits)
+
+    assert len(loaded.meshes) == MESHES
+    for id in meshes.meshes:
+        record = loaded.meshes.record(id)
+        expected = meshes.meshes.record(id)
+        assert scene_file.is_mapped(record.vertices)
+        np.testing.assert_array_equal(record.vertices, expected.vertices)
+        np.testing.assert_array_equal(record.faces, expected.faces)